@@ -2,14 +2,13 @@
 # Video recording and uploading to Google Dirve
 
 import streamlit as st
-import cv2
-import tempfile
 import os
 import time
-from datetime import datetime
 import pandas as pd
-from google.cloud import storage
 import subprocess  # For video conversion using ffmpeg
+from storage_backend import get_bucket
+from uploads import UploadQueue
+from recorder import MotionDetector, RecordingPipeline, RemuxRecorder, encode_preview
 
 # Google Cloud Storage settings
 bucket_name = "bucket_name"  # Updated bucket name
@@ -26,100 +25,180 @@ frame_width, frame_height = 1280, 720
 # RTSP source
 source_cam = 'rtsp of the the device'
 
+# Recording pipeline settings
+segment_seconds = 30  # Length of each uploaded segment
+frame_queue_size = 256  # Frames buffered between the camera and the segment writer
+upload_workers = 2  # Segments encoded and uploaded in parallel
+# "h264": frames piped into a single libx264 encode (upload-ready MP4, with preview)
+# "remux": the camera's H.264 stream is copied into MP4 segments without decoding (no preview)
+# "xvid": legacy XVID AVI followed by a full ffmpeg transcode
+writer_mode = "h264"
+
+# Live preview, decoupled from recording: a downscaled JPEG of the latest frame a few times per second
+preview_fps = 3
+preview_width = 640
+
+# Motion gating: only record (and upload) while something moves in front of the camera
+# Not available in "remux" mode because frames are not decoded there
+motion_gating = False
+motion_threshold = 0.01  # Share of changed pixels (on a downscaled frame) that counts as motion
+pre_roll_seconds = 2  # Footage kept from before the motion started
+post_roll_seconds = 5  # Footage kept after the motion stopped
+
 # Initialize DataFrame to store video information and analysis results
 if 'video_log' not in st.session_state:
-    st.session_state.video_log = pd.DataFrame(columns=["Video Title", "Upload Time", "Recording Time"])
-
-# Function to upload the file to Google Cloud Storage
-def upload_to_gcs(local_file, bucket_name, destination_blob_name):
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(destination_blob_name)
-    blob.upload_from_filename(local_file)
-    blob.content_type = 'video/mp4'  # Explicitly set MIME type to video/mp4
-    blob.patch()  # Update the blob metadata
-    upload_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    return upload_time
-
-# Function to initialize the camera
-def init_camera(source_camera):
-    # Setup camera capture
-    if 'cap' not in st.session_state or not st.session_state.cap.isOpened():
-        st.session_state.cap = cv2.VideoCapture(source_camera)
-        if not st.session_state.cap.isOpened():
-            st.error('Failed to open camera')
-        
-        st.session_state.cap.set(cv2.CAP_PROP_FRAME_WIDTH, frame_width)
-        st.session_state.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, frame_height)
-
-# Function to release the camera
-def release_camera():
-    if 'cap' in st.session_state:
-        st.session_state.cap.release()
+    st.session_state.video_log = pd.DataFrame(columns=["Video Title", "Upload Time", "Recording Time", "FPS", "Motion Score"])
+
+# Durable upload queue: segments are journaled in a spool directory and survive network outages and restarts
+spool_dir = "upload_spool"
+max_spool_bytes = 4 * 1024 ** 3  # Recording waits while more than this is waiting for upload
+
+@st.cache_resource
+def get_upload_queue():
+    bucket = get_bucket(bucket_name, key_file_path)
+    return UploadQueue(bucket, spool_dir, workers=upload_workers, max_spool_bytes=max_spool_bytes).start()
 
 # Function to convert the video to MP4 using ffmpeg
+# Runs in the pipeline's worker threads where st.* calls are lost, the error is shown with the segment instead
 def convert_to_mp4(input_file, output_file):
     try:
         subprocess.run(['ffmpeg', '-i', input_file, '-vcodec', 'libx264', output_file], check=True)
         return output_file
     except subprocess.CalledProcessError as e:
-        st.error(f"Error converting video to MP4: {e}")
-        return None
-
-# Function to record and upload a single video
-def record_and_upload_video(video_number):
-    raw_video_filename = f"video_{video_number}.avi"
-    mp4_video_filename = f"video_{video_number}.mp4"
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.avi')
-
-    # Update the placeholder with the currently recording video filename
-    current_video_placeholder.text(f"Currently recording: {mp4_video_filename}")
-
-    init_camera(source_cam)  # Initialize the RTSP camera
-
-    # Using XVID codec for AVI format
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(temp_file.name, fourcc, 20.0, (int(st.session_state.cap.get(3)), int(st.session_state.cap.get(4))))
-
-    start_time = time.time()
-    recording_start_time = datetime.now()
-    rounded_recording_time = recording_start_time.strftime("%H:%M")  # Round to nearest minute and show only time
-    st.session_state.recording_time = rounded_recording_time  # Store the rounded recording time
-
-    stframe = st.empty()  # Placeholder for the video stream
-    while time.time() - start_time < 30:  # Record for 30 seconds
-        ret, frame = st.session_state.cap.read()
-        if not ret:
-            st.write("Failed to capture image. Exiting...")
-            break
-        out.write(frame)
-        stframe.image(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), channels="RGB")
-
-    out.release()  # Ensure the video is finalized and written correctly
-    release_camera()  # Release the camera
-    stframe.empty()  # Clear the current frame after recording is done
-
-    # Convert the recorded AVI file to MP4
-    converted_video_path = os.path.join(tempfile.gettempdir(), mp4_video_filename)
-    converted_file = convert_to_mp4(temp_file.name, converted_video_path)
-
-    if converted_file:
-        upload_time = upload_to_gcs(converted_file, bucket_name, f"{analysis_folder}/{mp4_video_filename}")
-        st.session_state.last_video_file = mp4_video_filename
-        st.session_state.upload_time = upload_time
+        raise RuntimeError(f"Error converting video to MP4: {e}") from e
+
+# Function to start the recording pipeline (camera stays open across segments)
+def start_pipeline():
+    if st.session_state.get('pipeline') is not None:
+        return st.session_state.pipeline
+
+    upload_queue = get_upload_queue()
+
+    # Function used by the pipeline workers to hand a finished segment to the upload queue
+    def upload_segment(local_file, destination_blob_name):
+        upload_queue.put(local_file, destination_blob_name, content_type='video/mp4')
+        return "Queued"
+
+    if writer_mode == "remux":
+        st.session_state.pipeline = RemuxRecorder(
+            source_cam,
+            upload_fn=upload_segment,
+            blob_prefix=analysis_folder,
+            segment_seconds=segment_seconds,
+            upload_workers=upload_workers,
+            start_index=st.session_state.video_count + 1,
+        ).start()
+    else:
+        st.session_state.pipeline = RecordingPipeline(
+            source_cam,
+            encode_fn=convert_to_mp4,
+            upload_fn=upload_segment,
+            blob_prefix=analysis_folder,
+            segment_seconds=segment_seconds,
+            queue_size=frame_queue_size,
+            upload_workers=upload_workers,
+            start_index=st.session_state.video_count + 1,
+            frame_width=frame_width,
+            frame_height=frame_height,
+            writer_mode=writer_mode,
+            motion_detector=MotionDetector(threshold=motion_threshold) if motion_gating else None,
+            pre_roll=pre_roll_seconds,
+            post_roll=post_roll_seconds,
+        ).start()
+    return st.session_state.pipeline
+
+# Function to stop the pipeline, flushing the last segment and waiting for pending uploads
+def stop_pipeline():
+    pipeline = st.session_state.get('pipeline')
+    if pipeline is not None:
+        pipeline.stop(wait=True)
+        collect_finished_segments(pipeline)
+        st.session_state.pipeline = None
+
+# Function to move finished segments from the pipeline into the video log
+def collect_finished_segments(pipeline):
+    upload_times = st.session_state.upload_times
+    for done in get_upload_queue().drain_completed():
+        upload_times[os.path.basename(done["blob_name"])] = done["upload_time"]
+
+    st.session_state.video_count = pipeline.next_index - 1
+    for result in pipeline.drain_completed():
+        if "Error" in result:
+            st.error(f"{result['Video Title']}: {result['Error']}")
+            continue
+        st.session_state.last_video_file = result["Video Title"]
+        st.session_state.recording_time = result["Recording Time"]
 
         # Update DataFrame with new video information before analysis
         new_entry = pd.DataFrame({
-            "Video Title": [mp4_video_filename], 
-            "Upload Time": [upload_time], 
-            "Recording Time": [rounded_recording_time],  # Use rounded time
+            "Video Title": [result["Video Title"]],
+            "Upload Time": [result["Upload Time"]],  # "Queued" until the upload queue confirms it
+            "Recording Time": [result["Recording Time"]],  # Use rounded time
+            "FPS": [result["FPS"]],  # Measured capture frame rate of the segment
+            "Motion Score": [result["Motion Score"]],  # Peak share of changed pixels, empty without motion gating
         })
         st.session_state.video_log = pd.concat([st.session_state.video_log, new_entry], ignore_index=True)
 
-        os.unlink(temp_file.name)  # Remove the raw AVI file
-        os.unlink(converted_file)  # Remove the converted MP4 file
-    else:
-        st.error("Video conversion failed. The video was not uploaded.")
+    # Fill in the upload time of segments the upload queue has finished
+    video_log = st.session_state.video_log
+    for video_title in list(upload_times):
+        uploaded_rows = video_log["Video Title"] == video_title
+        if uploaded_rows.any():
+            video_log.loc[uploaded_rows, "Upload Time"] = st.session_state.upload_time = upload_times.pop(video_title)
+
+# Function to record and upload videos until recording is stopped
+def record_and_upload_video():
+    pipeline = start_pipeline()
+
+    stframe = st.empty()  # Placeholder for the video stream
+    status_placeholder = st.empty()  # Placeholder for the pipeline counters
+    log_placeholder = st.empty()  # Placeholder for the video log
+
+    last_preview = None
+    while st.session_state.recording and pipeline.is_running():
+        started = time.time()
+
+        # Update the placeholder with the currently recording video filename
+        if pipeline.current_segment:
+            current_video_placeholder.text(f"Currently recording: {pipeline.current_segment}")
+
+        # Only push a new preview when the camera delivered a new frame
+        frame = pipeline.latest_frame
+        if frame is not None and frame is not last_preview:
+            preview = encode_preview(frame, preview_width)
+            if preview:
+                stframe.image(preview)
+            last_preview = frame
+
+        stats = pipeline.stats()
+        status = (
+            f"Segments pending: {stats['segments_pending']} | Finished: {stats['segments_uploaded']} | "
+            f"Failed: {stats['segments_failed']}"
+        )
+        if stats.get('capture_fps'):
+            status += f" | Capture: {stats['capture_fps']:.1f} fps"
+        if stats.get('motion_score') is not None:
+            status += f" | Motion: {stats['motion_score']:.3f}"
+        if 'queue_depth' in stats:
+            status = (
+                f"Queue: {stats['queue_depth']}/{stats['queue_capacity']} frames | "
+                f"Dropped: {stats['frames_dropped']} | Read failures: {stats['read_failures']} | " + status
+            )
+        uploads = get_upload_queue().stats()
+        status += f" | Upload queue: {uploads['pending']} ({uploads['spool_bytes'] / 1024 ** 2:.1f} MB), {uploads['retries']} retries"
+        status_placeholder.text(status)
+
+        if not pipeline.completed.empty() or not get_upload_queue().completed.empty():
+            collect_finished_segments(pipeline)
+            log_placeholder.dataframe(st.session_state.video_log)
+
+        time.sleep(max(0.0, 1.0 / preview_fps - (time.time() - started)))
+
+    # The pipeline stopped by itself (e.g. ffmpeg missing or crashed): say why and release the camera
+    if pipeline.error:
+        st.error(pipeline.error)
+        st.session_state.recording = False
+        stop_pipeline()
 
 # Main function to manage start/stop functionality
 def main():
@@ -134,6 +213,8 @@ def main():
         st.session_state.last_video_file = None
     if 'upload_time' not in st.session_state:
         st.session_state.upload_time = ""
+    if 'upload_times' not in st.session_state:
+        st.session_state.upload_times = {}
     if 'recording_time' not in st.session_state:
         st.session_state.recording_time = ""
 
@@ -146,13 +227,10 @@ def main():
         st.session_state.recording = not st.session_state.recording
 
     # If recording is active, keep recording and uploading videos until stopped
-    while st.session_state.recording:
-        st.session_state.video_count += 1
-        record_and_upload_video(st.session_state.video_count)
-
-        # Check for the Stop button to break the loop
-        if not st.session_state.recording:
-            break
+    if st.session_state.recording:
+        record_and_upload_video()
+    else:
+        stop_pipeline()
 
     # Optionally, you can display the video log below (without the currently recording video)
     if len(st.session_state.video_log) > 0:
@@ -1,33 +1,28 @@
 import streamlit as st
-import pandas as pd
+import argparse
+import json
 import os
+import sys
 import time
-from datetime import datetime
-from google.cloud import storage
-import pytz  # Import pytz for timezone handling
-from vertexai.generative_models import GenerativeModel, Part, SafetySetting
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from storage_backend import get_bucket, is_local
+from uploads import upload_file
+import functools
 import tempfile  # Import tempfile module
-import vertexai
-
-st.set_page_config(
-    page_title="Welcome",
-    page_icon="🏡¡",
-    layout="centered",
-    initial_sidebar_state="expanded"
-)
+from analysis_engine import call_with_retries, get_generative_model, get_rate_limiter, run_concurrent
+from analysis_records import publish_records
+from analysis_store import blob_version, get_analysis_store, prompt_hash
+from blob_catalog import format_created_time, get_blob_catalog
+from core import finish_run, read_asset, start_run
+from metrics import configure_metrics, get_metrics, serve_metrics
+from segment_analysis import format_timestamp, merge_timeline, probe_duration, split_video, video_duration
+from video_reduce import reduce_video, remap_timestamps
 
 def show_svg(path):
-    with open(path, 'r', encoding='utf-8') as file:
-        svg = file.read()
-        st.markdown(svg, unsafe_allow_html=True)
+    st.markdown(read_asset(path), unsafe_allow_html=True)
 
 path_to_svg = 'logo.svg'
-show_svg(path_to_svg)
 
 # Google Cloud Storage settings
 bucket_name = "bucket_name"
@@ -36,80 +31,87 @@ key_file_path = "proj_1.json"
 
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = key_file_path
 
-# Define the timezone for Berlin (UTC+2)
-berlin_timezone = pytz.timezone('Europe/Berlin')
+# Folder listing, cached across reruns and refreshed incrementally once it is older than the TTL
+video_prefix = f"{analysis_folder}/"
+catalog_ttl = 60  # Seconds
 
-# Initialize DataFrame to store video information and analysis results
-video_log = pd.DataFrame(columns=["Video Title", "Upload Time", "Created Time", "Analysis"])
+# Worker mode: a full listing this often finds new camera folders, failing videos are retried with a
+# doubling delay and given up after worker_max_attempts (recorded in worker_failures_path, not retried again)
+worker_full_refresh = 60  # Seconds
+worker_max_attempts = 5
+worker_retry_delay = 60  # Seconds before the second attempt
+worker_failures_path = "worker_failures.jsonl"
 
-# Initialize Google Cloud Storage client and retrieve file metadata
-storage_client = storage.Client.from_service_account_json(key_file_path)
+# Function to upload the file to Google Cloud Storage
+def upload_to_gcs(local_file, bucket_name, destination_blob_name, content_type='application/pdf'):
+    try:
+        bucket = get_bucket(bucket_name, key_file_path)
+        upload_time = upload_file(bucket, local_file, destination_blob_name, content_type)
+        st.write(f"File uploaded successfully to {destination_blob_name} at {upload_time}")
+        return upload_time
+    except Exception as e:
+        st.write(f"Error uploading file to GCS: {str(e)}")
+        return None
 
-# Access a specific bucket and list contents only in the 'robot' folder
-bucket = storage_client.bucket(bucket_name)
-prefix = "robot/"  # Specify the folder to list files from
-blobs = list(bucket.list_blobs(prefix=prefix))
+# Vertex AI settings, the model is created once per process
+vertex_project = "project_name"
+vertex_location = "us-central1"
+model_name = "gemini-1.5-flash-001"
 
-# Sort blobs by creation time (oldest first)
-blobs.sort(key=lambda x: x.time_created)
+# Analysis throughput settings, tune requests_per_minute to the project's quota
+analysis_concurrency = 4  # Videos analyzed in parallel
+requests_per_minute = 30  # Token bucket rate shared by all analysis threads
+max_retries = 5  # Retries per model call on 429 / quota errors, with jittered backoff
 
-# List to store file information
-file_info_list = []
+# Optional pre-reduction: analyze a proxy with lower fps and resolution and static spans cut out
+reduce_videos = False
+proxy_fps = 1.0
+proxy_width = 640
+proxy_folder = f"{analysis_folder}/proxies"
 
-# Iterate over each blob to get the file information
-for blob in blobs:
-    file_name = blob.name
-    if blob.time_created:
-        # Convert to the specified timezone (UTC+2)
-        created_time_utc = blob.time_created.replace(tzinfo=pytz.UTC)
-        created_time_berlin = created_time_utc.astimezone(berlin_timezone)
+# Optional segment mode: videos longer than long_video_seconds are split into parts of analysis_segment_seconds
+# (stream copy, no re-encode) that are analyzed concurrently, a final call summarizes the merged timeline
+segment_long_videos = False
+long_video_seconds = 120
+analysis_segment_seconds = 60
+segment_concurrency = 4
+segments_folder = f"{analysis_folder}/segments"
 
-        # Format the created time to a more friendly format
-        created_time = created_time_berlin.strftime("%Y-%m-%d %H:%M:%S")
-        created_date = created_time_berlin.date().isoformat()
-        time_ = created_time_berlin.strftime("%H:%M:%S")  # Extract only the time part
-    else:
-        created_time = "Not available"
-        created_date = "Not available"
-        time_ = "Not available"
+segment_prompt = """{prompt_text}
 
-    # Append the file information to the list
-    file_info_list.append({
-        "file_name": file_name,
-        "created_date": created_date,
-        "created_time": created_time,
-        "time_": time_  # Add the new time_only field
-    })
+This is part {part} of {parts} of the video and covers {start} to {end} of it. Only describe this part:
+list the events in sequence with mm:ss timestamps counted from the start of this part."""
 
-# Create a DataFrame from the list of file information
-df = pd.DataFrame(file_info_list)
+summary_prompt = """Below is the timeline of events of the video {video_filename}, analyzed in consecutive parts.
+Timestamps are counted from the start of the whole video.
 
-# Function to upload the file to Google Cloud Storage
-def upload_to_gcs(local_file, bucket_name, destination_blob_name):
-    try:
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(destination_blob_name)
-        blob.upload_from_filename(local_file)
-        upload_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        st.write(f"File uploaded successfully to {destination_blob_name} at {upload_time}")
-        return upload_time
-    except Exception as e:
-        st.write(f"Error uploading file to GCS: {str(e)}")
-        return None
+{timeline}
 
-# Function to analyze a video
-def analyze_video(video_filename, prompt_text):
-    st.write(f"Analyzing {video_filename}...")
+Using only this timeline, answer the following instructions for the whole video and keep the timestamps of the events:
+
+{prompt_text}"""
+
+# Results are stored per video version, model and prompt, so each run only analyzes new or changed videos
+analysis_store_path = "analysis_store.sqlite"
 
-    vertexai.init(project="project name, location="us-central1")
-    
-    model = GenerativeModel("gemini-1.5-flash-001")
+# The PDF report is kept as per-day parts of at most this many rows, only changed parts are re-rendered
+report_parts_dir = "report_parts"
+report_rows_per_part = 500
 
-    # Use the provided prompt_text from the user input
-    video1 = Part.from_uri(mime_type="video/mp4", uri=f"gs://{bucket_name}/{analysis_folder}/{video_filename}")
+# Structured copy of the analyses for consumers (Script3): JSONL per batch plus a Parquet rollup
+records_folder = f"{analysis_folder}/records"
 
-    safety_settings = [
+# Every model and storage call is timed and appended to metrics_path, /metrics serves the totals
+metrics_path = "metrics_script2.jsonl"
+metrics_port = 9102
+configure_metrics(metrics_path)
+
+# Function to build the safety settings once per process (the Vertex AI SDK is only imported here)
+@functools.lru_cache(maxsize=None)
+def get_safety_settings():
+    from vertexai.generative_models import SafetySetting
+
+    return [
         SafetySetting(category=SafetySetting.HarmCategory.HARM_CATEGORY_HATE_SPEECH, 
                       threshold=SafetySetting.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE),
         SafetySetting(category=SafetySetting.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT, 
@@ -120,59 +122,164 @@ def analyze_video(video_filename, prompt_text):
                       threshold=SafetySetting.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE),
     ]
 
-    responses = model.generate_content([prompt_text, video1], safety_settings=safety_settings, stream=True)
-    
-    result_text = ""
-    for response in responses:
-        result_text += response.text
+# Default prompt, editable in the app
+default_prompt ="""You are analyzing the video {video_filename}. Provide a detailed summary of the video content in max 250 words, provide a lot of details.  is a person taking anything in the video (include the answer only if someone takes or is carrying away something)? do not provide any sound info.
+Provide the events (only clear facts) in the sequence (you can provide an info what happened in the video and what a person was doing). Is any person in the video taking taking anything? (mention only if that happens). If there is one person use a singular form.
+Count only people who are directly in front of the camera (ignore reflection in the glass).
+ If there no people, say there is no people instead of 0 or zero."""
+# Function to reference a video for the model: by gs:// URI, or inline when the storage is local
+def video_part(blob_name):
+    from vertexai.generative_models import Part
+
+    bucket = get_bucket(bucket_name, key_file_path)
+    if is_local(bucket):
+        return Part.from_data(bucket.blob(blob_name).download_as_bytes(), mime_type="video/mp4")
+    return Part.from_uri(mime_type="video/mp4", uri=f"gs://{bucket_name}/{blob_name}")
+
+# Function to build and upload the reduced proxy of a video, returns its blob name and the timestamp map
+def prepare_proxy(video_filename):
+    bucket = get_bucket(bucket_name, key_file_path)
+    with tempfile.TemporaryDirectory() as work_dir:
+        original_path = os.path.join(work_dir, "original.mp4")
+        proxy_path = os.path.join(work_dir, os.path.basename(video_filename))
+        with get_metrics().call("storage", "download") as call:
+            bucket.blob(f"{analysis_folder}/{video_filename}").download_to_filename(original_path)
+            call.bytes = os.path.getsize(original_path)
+        reduction = reduce_video(original_path, proxy_path, target_fps=proxy_fps, max_width=proxy_width)
+        upload_file(bucket, proxy_path, f"{proxy_folder}/{video_filename}", 'video/mp4')
+    return f"{proxy_folder}/{video_filename}", reduction["time_map"]
+
+# Function to run one streaming model call and return its text
+# The call waits for the shared rate limiter and only the call itself is retried on 429 / quota errors,
+# not the download, proxy or upload work around it
+def generate_text(contents):
+    model = get_generative_model(vertex_project, vertex_location, model_name)
+
+    def generate(contents):
+        # Wall time, time to first chunk and token usage of the call go to the metrics
+        with get_metrics().call("gemini", model_name) as call:
+            responses = model.generate_content(contents, safety_settings=get_safety_settings(), stream=True)
+
+            result_text = ""
+            for response in call.stream(responses):
+                result_text += response.text
+        return result_text
+
+    return call_with_retries(generate, contents, get_rate_limiter(requests_per_minute), max_retries,
+                             retry_metric=("gemini", model_name))
+
+# Function to count the model call retries of this process so far
+def model_retries():
+    return sum(row["Retries"] for row in get_metrics().summary()
+               if row["Kind"] == "gemini" and row["Name"] == model_name)
+
+# Function to read the duration of a video without downloading it, None if that is not possible
+# (GCS: ffmpeg reads the header through a short-lived signed URL, which needs service account credentials)
+def blob_duration(blob_name):
+    bucket = get_bucket(bucket_name, key_file_path)
+    blob = bucket.blob(blob_name)
+    if is_local(bucket):
+        return probe_duration(blob.path)
+    try:
+        url = blob.generate_signed_url(version="v4", expiration=timedelta(minutes=10), method="GET")
+    except Exception:
+        return None
+    with get_metrics().call("storage", "probe"):
+        return probe_duration(url)
+
+# Function to analyze a long video part by part, returns None for videos short enough for one call
+def analyze_in_segments(video_filename, video_blob_name, prompt_text):
+    # Only videos that will be split are downloaded
+    duration = blob_duration(video_blob_name)
+    if duration is not None and duration <= long_video_seconds:
+        return None
+
+    bucket = get_bucket(bucket_name, key_file_path)
+    with tempfile.TemporaryDirectory() as work_dir:
+        local_path = os.path.join(work_dir, "video.mp4")
+        with get_metrics().call("storage", "download") as call:
+            bucket.blob(video_blob_name).download_to_filename(local_path)
+            call.bytes = os.path.getsize(local_path)
+        if duration is None and video_duration(local_path) <= long_video_seconds:
+            return None
+
+        parts = split_video(local_path, os.path.join(work_dir, "parts"), analysis_segment_seconds)
+        part_names = [f"{segments_folder}/{os.path.splitext(video_filename)[0]}/{os.path.basename(path)}"
+                      for path, _, _ in parts]
+        for (path, _, _), part_name in zip(parts, part_names):
+            upload_file(bucket, path, part_name, 'video/mp4')
+
+    def analyze_part(index):
+        _, start, end = parts[index]
+        text = segment_prompt.format(prompt_text=prompt_text, part=index + 1, parts=len(parts),
+                                     start=format_timestamp(start), end=format_timestamp(end))
+        return generate_text([text, video_part(part_names[index])])
+
+    try:
+        results, _ = run_concurrent(range(len(parts)), analyze_part, concurrency=segment_concurrency, retries=0)
+    finally:
+        for part_name in part_names:
+            try:
+                bucket.blob(part_name).delete()
+            except Exception:
+                pass  # Leftover parts are harmless, the next analysis overwrites them
+    for _, error in results:
+        if error is not None:
+            raise error
+
+    # Part timestamps are shifted by the part's start, one summarizing call writes the final text
+    timeline = merge_timeline([(start, end, text) for (_, start, end), (text, _) in zip(parts, results)])
+    return generate_text([summary_prompt.format(video_filename=video_filename, timeline=timeline,
+                                                prompt_text=prompt_text)])
+
+# Function to analyze a video (runs in the analysis worker threads, so no st.* calls here)
+def analyze_video(video_filename, prompt_text):
+    video_blob_name = f"{analysis_folder}/{video_filename}"
+    time_map = None
+    if reduce_videos:
+        video_blob_name, time_map = prepare_proxy(video_filename)
 
-    # Limit to max 250 words
-    result_text = ' '.join(result_text.split()[:250])
+    try:
+        result_text = None
+        if segment_long_videos:
+            result_text = analyze_in_segments(video_filename, video_blob_name, prompt_text)
+        segmented = result_text is not None
+
+        if result_text is None:
+            # Use the provided prompt_text from the user input
+            video1 = video_part(video_blob_name)
+            result_text = generate_text([prompt_text, video1])
+    finally:
+        # The proxy is only needed for this analysis, a rerun builds it again
+        if reduce_videos:
+            try:
+                get_bucket(bucket_name, key_file_path).blob(video_blob_name).delete()
+            except Exception:
+                pass  # A leftover proxy is harmless, the next analysis overwrites it
+
+    # Timestamps the model saw in the proxy point to the original video again
+    if time_map:
+        result_text = remap_timestamps(result_text, time_map)
+
+    # Limit to max 250 words, the summary of a long video keeps its whole timeline
+    if not segmented:
+        result_text = ' '.join(result_text.split()[:250])
     return result_text
 
-# Function to convert DataFrame to PDF and upload
+# Function to convert DataFrame to PDF and upload, returns the error message if that failed
 def save_analysis_to_pdf(video_log):
     try:
         pdf_file = "video_analysis2.pdf"
         pdf_path = os.path.join(tempfile.gettempdir(), pdf_file)  # Use tempfile to generate a temp file path
 
-        doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-
-        # Use a smaller font size for the table
-        small_style = styles['Normal']
-        small_style.fontSize = 8  # Reduce font size
-
-        # Convert DataFrame to list of lists for table
-        data = [video_log.columns.tolist()]  # Header row
-        for index, row in video_log.iterrows():
-            # Create paragraphs for each cell to handle text wrapping and size
-            row_data = [
-                Paragraph(str(row["Video Title"]), small_style),
-                Paragraph(str(row["Upload Time"]), small_style),
-                Paragraph(str(row["Created Time"]), small_style),
-                Paragraph(str(row["Analysis"]), small_style),
-            ]
-            data.append(row_data)
-
-        # Set column widths
-        table = Table(data, colWidths=[1.2*inch, 1.2*inch, 1.2*inch, 5.1*inch])  # Adjust colWidths for Analysis column
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Align text to the top
-        ]))
-
-        elements.append(table)
-        doc.build(elements)
+        # Only parts with new or changed rows are rendered, the rest is reused from earlier runs
+        from report import ReportBuilder  # reportlab is only needed once a report is built
+
+        builder = ReportBuilder(report_parts_dir, rows_per_part=report_rows_per_part, split_by_day=True)
+        part_paths, rendered = builder.build(video_log)
+        builder.assemble(part_paths, pdf_path)
 
+        st.write(f"Rendered {rendered} of {len(part_paths)} report parts.")
         st.write("PDF file generated successfully.")
 
         # Upload to GCS
@@ -184,68 +291,293 @@ def save_analysis_to_pdf(video_log):
 
         # Clean up temporary file
         os.unlink(pdf_path)
+        return None if upload_result else "PDF file upload failed"
     except Exception as e:
         st.write(f"Error saving analysis to PDF: {str(e)}")
+        return str(e)
 
-# Streamlit App
-st.title("Video Analysis and Report Generation 🗒️")
-
-# Editable prompt for the user
-default_prompt ="""You are analyzing the video {video_filename}. Provide a detailed summary of the video content in max 250 words, provide a lot of details.  is a person taking anything in the video (include the answer only if someone takes or is carrying away something)? do not provide any sound info.
-Provide the events (only clear facts) in the sequence (you can provide an info what happened in the video and what a person was doing). Is any person in the video taking taking anything? (mention only if that happens). If there is one person use a singular form.
-Count only people who are directly in front of the camera (ignore reflection in the glass).
- If there no people, say there is no people instead of 0 or zero."""
-prompt_text = st.text_area("Enter your prompt:", default_prompt)
+# Function to write the analyses of a batch and the rollup of all analyses to the bucket, returns the error message if that failed
+def save_analysis_records(prompt_key, batch_keys):
+    try:
+        records = get_analysis_store(analysis_store_path).records(model_name, prompt_key)
+        batch = [record for record in records if (record["blob_name"], record["blob_version"]) in batch_keys]
+        bucket = get_bucket(bucket_name, key_file_path)
+        for name in publish_records(bucket, records_folder, batch, records):
+            st.write(f"Analysis records uploaded to {name}")
+        return None
+    except Exception as e:
+        st.write(f"Error saving analysis records: {str(e)}")
+        return str(e)
+
+# Function to get the cache key of a prompt (proxies change what the model sees, so their settings are part of it)
+def analysis_key(prompt_text):
+    if reduce_videos:
+        prompt_text = f"{prompt_text}\n[proxy {proxy_fps} fps {proxy_width}px]"
+    if segment_long_videos:
+        prompt_text = f"{prompt_text}\n[segments {analysis_segment_seconds} s over {long_video_seconds} s]"
+    return prompt_hash(prompt_text)
+
+# Function to tell recorded videos (in the folder or a camera subfolder) from proxies and segment parts
+def is_recorded_video(blob_name):
+    return (blob_name.startswith(video_prefix) and blob_name.endswith(".mp4")
+            and os.path.basename(blob_name).startswith("video_")
+            and not blob_name.startswith((f"{proxy_folder}/", f"{segments_folder}/")))
+
+# Function to read the videos the worker gave up on, they are not retried after a restart either
+def load_worker_failures():
+    if not os.path.exists(worker_failures_path):
+        return set()
+    with open(worker_failures_path, encoding="utf-8") as file:
+        return {(failure["blob_name"], failure["blob_version"]) for failure in map(json.loads, file)}
+
+# Function to record a video the worker gave up on
+def record_worker_failure(key, attempts, error):
+    failure = {"blob_name": key[0], "blob_version": key[1], "attempts": attempts, "error": str(error),
+               "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+    with open(worker_failures_path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(failure) + "\n")
+
+# Function to store the analysis of a video blob
+def store_analysis(store, prompt_key, blob, created_time_str, upload_time, analysis_result):
+    store.save(blob.name, blob_version(blob), model_name, prompt_key,
+               blob.name[len(video_prefix):], upload_time, created_time_str, analysis_result)
 
 # Function to check for videos and analyze them
-def analyze_videos():
-    storage_client = storage.Client.from_service_account_json(key_file_path)  # Initialize storage client
-    bucket = storage_client.bucket(bucket_name)
-    prefix = "robot/"  # Define the folder prefix
+def analyze_videos(prompt_text):
+    catalog = get_blob_catalog(bucket_name, video_prefix, key_file_path, ttl=catalog_ttl)
 
-    # List contents of the 'robot' folder
-    blobs = list(bucket.list_blobs(prefix=prefix))
+    # Video blobs of the analysis folder and its camera subfolders, sorted by creation time (oldest first)
+    blobs = [blob for blob in catalog.list(suffix=".mp4") if is_recorded_video(blob.name)]
 
-    # Sort blobs by creation time (oldest first)
-    blobs.sort(key=lambda x: x.time_created)
+    store = get_analysis_store(analysis_store_path)
+    prompt_key = analysis_key(prompt_text)
+    analyzed = store.known_keys(model_name, prompt_key)
 
+    videos = []
+    reused = 0
     for blob in blobs:
-        try:
-            video_filename = blob.name.replace(prefix, "")
-
-            # Check if the blob name matches the video file naming pattern
-            if not video_filename.startswith("video_") or not video_filename.endswith(".mp4"):
-                continue
+        video_filename = blob.name[len(video_prefix):]
+        created_time_str = catalog.created_time(blob.name)
 
-            # Retrieve created time from DataFrame
-            created_time_row = df[df["file_name"] == blob.name]
-            if not created_time_row.empty:
-                created_time_str = created_time_row.iloc[0]["created_time"]
-            else:
-                created_time_str = "Not available"
-
-            # Analyze the video with the user-provided or default prompt
-            upload_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            analysis_result = analyze_video(video_filename, prompt_text)
-            video_log_entry = {
-                "Video Title": video_filename,
-                "Upload Time": upload_time,
-                "Created Time": created_time_str,
-                "Analysis": analysis_result
-            }
-            video_log.loc[len(video_log)] = video_log_entry
-            st.write(f"Analysis for {video_filename}: {analysis_result}")
-
-            # Wait for 60 seconds before processing the next video
-            time.sleep(10)
-
-        except Exception as e:
-            st.write(f"Error analyzing {video_filename}: {str(e)}")
+        # Skip videos already analyzed in an earlier run with the same prompt and model
+        if (blob.name, blob_version(blob)) in analyzed:
+            reused += 1
             continue
+        videos.append((video_filename, created_time_str, blob))
+
+    st.write(f"{reused} videos already analyzed, {len(videos)} new or changed videos to analyze.")
+
+    # Analyze the video with the user-provided or default prompt
+    def analyze(video):
+        analysis_result = analyze_video(video[0], prompt_text)
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S"), analysis_result
+
+    if not videos:
+        return store.report(model_name, prompt_key)
+
+    progress = st.progress(0.0, text=f"Analyzing {len(videos)} videos...")
+    finished = []
+    stored = set()
+
+    # Every analysis is stored as soon as it finishes, an interrupted run keeps what it already paid for
+    def show_result(index, video, result, error):
+        finished.append(index)
+        progress.progress(len(finished) / len(videos), text=f"Analyzed {len(finished)} of {len(videos)} videos")
+        if error is not None:
+            st.write(f"Error analyzing {video[0]}: {str(error)}")
+            return
+        video_filename, created_time_str, blob = video
+        store_analysis(store, prompt_key, blob, created_time_str, *result)
+        stored.add((blob.name, blob_version(blob)))
+        st.write(f"Analysis for {video_filename}: {result[1]}")
+
+    retries_before = model_retries()
+    _, stats = run_concurrent(
+        videos,
+        analyze,
+        concurrency=analysis_concurrency,
+        retries=0,  # generate_text retries the model calls
+        on_result=show_result,
+    )
+
+    # The report sorts by creation time, so the order the analyses finished in does not matter
+    if stored:
+        save_analysis_records(prompt_key, stored)
+
+    st.write(
+        f"Analyzed {stats['items'] - stats['failed']} of {stats['items']} videos in {stats['seconds']:.1f} s "
+        f"({stats['items_per_minute']:.1f} videos/min, {model_retries() - retries_before} rate limit retries)"
+    )
+
+    # The report covers every stored analysis, not only the ones from this run
+    return store.report(model_name, prompt_key)
+
+# Headless worker: analyze new segments as soon as they show up in the bucket
+def run_worker(prompt_text, poll_interval=5, max_in_flight=4, notification_dir=None, report_interval=300):
+    """Poll the folder (or consume notification files) and analyze every new video once.
+
+    Processing is at-least-once: a video only counts as done when its analysis is stored.
+    A failed video is tried again after worker_retry_delay (doubling with every attempt) and
+    given up after worker_max_attempts, which is recorded in worker_failures_path. notification_dir is a local stand-in
+    for bucket notifications, a directory of JSON files with the blob "name" of new uploads.
+    """
+    catalog = get_blob_catalog(bucket_name, video_prefix, key_file_path, ttl=poll_interval,
+                               full_refresh=worker_full_refresh)
+    bucket = get_bucket(bucket_name, key_file_path)
+    store = get_analysis_store(analysis_store_path)
+    prompt_key = analysis_key(prompt_text)
+    done = store.known_keys(model_name, prompt_key)
+    gave_up = load_worker_failures()
+    attempts = {}  # (blob name, blob version) -> (failed attempts, time of the next attempt)
+    in_flight = {}  # (blob name, blob version) -> (future, blob, notification file)
+    last_report = time.time()
+    unpublished = set()  # Analyses not yet in a records batch
+
+    def analyze(blob):
+        analysis_result = analyze_video(blob.name[len(video_prefix):], prompt_text)
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S"), analysis_result
+
+    # Notification files name new blobs directly, polling finds everything else
+    def candidates():
+        found = []
+        if notification_dir:
+            for name in sorted(os.listdir(notification_dir)):
+                path = os.path.join(notification_dir, name)
+                try:
+                    with open(path, encoding="utf-8") as file:
+                        blob = bucket.get_blob(json.load(file)["name"])
+                except (ValueError, KeyError):
+                    blob = None  # Not a notification
+                if blob is None:
+                    os.unlink(path)  # Unreadable, or the blob was deleted again before we got to it
+                else:
+                    found.append((blob, path))
+        found.extend((blob, None) for blob in catalog.list(suffix=".mp4"))
+        return found
+
+    print(f"Watching {bucket_name}/{video_prefix} ({len(done)} videos already analyzed)", flush=True)
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="analysis") as executor:
+        while True:
+            for blob, notification in candidates():
+                if not is_recorded_video(blob.name):
+                    if notification:
+                        os.unlink(notification)
+                    continue
+                key = (blob.name, blob_version(blob))
+                if key in done or key in gave_up:
+                    if notification:
+                        os.unlink(notification)
+                    continue
+                if key in in_flight or len(in_flight) >= max_in_flight:
+                    continue
+                if time.time() < attempts.get(key, (0, 0.0))[1]:
+                    continue  # Failed recently, wait for its backoff
+                future = executor.submit(analyze, blob)
+                in_flight[key] = (future, blob, notification)
+
+            if not in_flight:
+                time.sleep(poll_interval)
+                continue
+            finished, _ = wait([future for future, _, _ in in_flight.values()], timeout=poll_interval,
+                               return_when=FIRST_COMPLETED)
+            for key, (future, blob, notification) in list(in_flight.items()):
+                if future not in finished:
+                    continue
+                del in_flight[key]
+                video_filename = blob.name[len(video_prefix):]
+                try:
+                    upload_time, analysis_result = future.result()
+                except Exception as e:
+                    failed = attempts.get(key, (0, 0.0))[0] + 1
+                    if failed >= worker_max_attempts:
+                        attempts.pop(key, None)
+                        gave_up.add(key)
+                        record_worker_failure(key, failed, e)
+                        if notification and os.path.exists(notification):
+                            os.unlink(notification)
+                        print(f"Giving up on {video_filename} after {failed} attempts: {e}", flush=True)
+                    else:
+                        delay = worker_retry_delay * 2 ** (failed - 1)
+                        attempts[key] = (failed, time.time() + delay)
+                        print(f"Error analyzing {video_filename} (attempt {failed}, next in {delay:.0f} s): {e}",
+                              flush=True)
+                    continue
+                attempts.pop(key, None)
+                store_analysis(store, prompt_key, blob, format_created_time(blob), upload_time, analysis_result)
+                done.add(key)
+                unpublished.add(key)
+                if notification and os.path.exists(notification):
+                    os.unlink(notification)
+                latency = time.time() - blob.time_created.timestamp() if blob.time_created else float("nan")
+                print(f"Analyzed {video_filename} {latency:.0f} s after upload", flush=True)
+
+            # Rebuild the report and publish the records now and then when there are new results
+            # Unpublished analyses stay pending when the records could not be written
+            if report_interval and unpublished and time.time() - last_report >= report_interval:
+                error = save_analysis_records(prompt_key, unpublished)
+                if error:
+                    print(f"Error saving analysis records: {error}", flush=True)
+                else:
+                    unpublished = set()
+                error = save_analysis_to_pdf(store.report(model_name, prompt_key))
+                if error:
+                    print(f"Error saving analysis to PDF: {error}", flush=True)
+                last_report = time.time()
+
+# Function to show the call metrics of this process in the sidebar
+def show_metrics_panel():
+    with st.sidebar.expander("Call metrics"):
+        summary = get_metrics().summary()
+        if summary:
+            st.dataframe(summary, hide_index=True)
+        else:
+            st.write("No calls yet.")
 
-# Run analysis if the button is clicked
-if st.button("Start Analysis"):
-    analyze_videos()
-
-    # Save the DataFrame as a PDF file
-    save_analysis_to_pdf(video_log)
+# Streamlit App
+def main():
+    run = start_run("Script2")
+    st.set_page_config(
+        page_title="Welcome",
+        page_icon="🏡¡",
+        layout="centered",
+        initial_sidebar_state="expanded"
+    )
+    show_svg(path_to_svg)
+
+    st.title("Video Analysis and Report Generation 🗒️")
+
+    # Editable prompt for the user
+    prompt_text = st.text_area("Enter your prompt:", default_prompt)
+
+    # Run analysis if the button is clicked
+    if st.button("Start Analysis"):
+        video_log = analyze_videos(prompt_text)
+
+        # Save the DataFrame as a PDF file
+        save_analysis_to_pdf(video_log)
+
+    serve_metrics(metrics_port)
+    finish_run(run)
+    show_metrics_panel()
+
+if __name__ == "__main__":
+    # python Script2.py --worker [--poll-interval 5] [--max-in-flight 4] [--notification-dir DIR]
+    if "--worker" in sys.argv:
+        parser = argparse.ArgumentParser(description="Analyze new videos as soon as they are uploaded")
+        parser.add_argument("--worker", action="store_true")
+        parser.add_argument("--poll-interval", type=float, default=5)
+        parser.add_argument("--max-in-flight", type=int, default=analysis_concurrency)
+        parser.add_argument("--notification-dir", help="Directory of JSON files naming newly uploaded blobs")
+        parser.add_argument("--report-interval", type=float, default=300, help="Seconds between PDF rebuilds, 0 = never")
+        parser.add_argument("--prompt-file", help="Prompt to use instead of the default prompt")
+        parser.add_argument("--metrics-port", type=int, default=metrics_port, help="Port of the /metrics endpoint, 0 = off")
+        args = parser.parse_args()
+        if args.metrics_port:
+            serve_metrics(args.metrics_port)
+        worker_prompt = default_prompt
+        if args.prompt_file:
+            with open(args.prompt_file, encoding="utf-8") as file:
+                worker_prompt = file.read()
+        run_worker(worker_prompt, args.poll_interval, args.max_in_flight, args.notification_dir, args.report_interval)
+    else:
+        main()
@@ -1,15 +1,25 @@
 import streamlit as st
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores import FAISS
-from langchain_google_vertexai import ChatVertexAI, VertexAI, VertexAIEmbeddings
-from langchain.chains.question_answering import load_qa_chain
-from langchain.prompts import PromptTemplate
 import os
-from google.cloud import storage
-import vertexai
-from vertexai.generative_models import GenerativeModel
-from langchain_core.messages import HumanMessage, SystemMessage
+# PyPDF2, LangChain's splitter / FAISS store / Vertex AI classes and faiss are imported where
+# they are first used, so the page renders without waiting for them
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+import collections
+import datetime
+import json
+import re
+import numpy as np
+from analysis_records import load_records, records_version
+from blob_catalog import get_blob_catalog
+from core import finish_run, init_vertex, read_asset, start_run
+from storage_backend import get_bucket, is_local
+from embedding_cache import CachedEmbeddings, get_embedding_cache
+import threading
+import uuid
+from query_router import RecordIndex
+from metrics import configure_metrics, get_metrics, serve_metrics
+from video_cache import get_video_cache
 
 
 st.set_page_config(
@@ -20,10 +30,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+script_run = start_run("Script3")
+
 def show_svg(path):
-    with open(path, 'r', encoding='utf-8') as file:
-        svg = file.read()
-        st.markdown(svg, unsafe_allow_html=True)
+    st.markdown(read_asset(path), unsafe_allow_html=True)
 path_to_svg = 'logo.svg'
 
 
@@ -40,8 +50,9 @@ show_svg(path_to_svg)
 key_file_path = "proj_1.json"  # Path to service account key file
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = key_file_path  # Set environment variable for GCP credentials
 
-vertexai.init(project="project_name", location="us-central1")
-model = GenerativeModel("gemini-1.5-flash-001")
+# Vertex AI is initialized once per process, on the first embedding or chat call
+vertex_project = "project_name"
+vertex_location = "us-central1"
 
 # Configuration for GCS and file paths
 bucket_name = "bucket_name"
@@ -49,40 +60,193 @@ analysis_folder = "folder_name"  # Folder in the GCS bucket for PDFs
 pdf_filename = "video_analysis_demo.pdf"  # Name of the PDF file in GCS
 source_blob_name = f"{analysis_folder}/{pdf_filename}"  # Full path to the file in GCS
 destination_file_name = "/tmp/latest-pdf-file.pdf"  # Local path for downloading the file
+records_prefix = f"{analysis_folder}/records"  # Structured analysis records written by Script2
+
+# Videos are listed at most every video_list_ttl seconds and played from a size-capped local cache,
+# or with video_playback = "signed_url" streamed by the browser straight from GCS with range requests
+video_list_ttl = 60
+derived_folders = ("proxies", "segments")  # Script2's proxies and segment parts, not recordings
+video_cache_dir = "/tmp/video_cache"
+video_cache_max_bytes = 2 * 1024 ** 3
+video_playback = "cache"
+signed_url_minutes = 30
+
+# Number of video analyses retrieved as context for an answer
+retrieval_k = 4
+
+# Answers are cached per normalized question, filters and index version
+answer_cache_size = 256
+
+# The chat index is rebuilt only when a new report version shows up, checked at most every report_version_ttl seconds
+report_version_ttl = 30
+
+# Every embedding, chat and storage call is timed and appended to metrics_path, /metrics serves the totals
+metrics_path = "metrics_script3.jsonl"
+metrics_port = 9103
+configure_metrics(metrics_path)
+
+class InstrumentedEmbeddings(Embeddings):
+    """Embeddings that record the wall time and characters of every embedding call."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._embeddings = None
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self):
+        """The Vertex AI client, created once on the first embedding call."""
+        with self._lock:
+            if self._embeddings is None:
+                from langchain_google_vertexai import VertexAIEmbeddings
+
+                init_vertex(vertex_project, vertex_location)
+                self._embeddings = VertexAIEmbeddings(self.model_name)
+            return self._embeddings
+
+    def embed_documents(self, texts):
+        with get_metrics().call("embedding", self.model_name) as call:
+            call.input_chars = sum(len(text) for text in texts)
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with get_metrics().call("embedding", self.model_name) as call:
+            call.input_chars = len(text)
+            return self.embeddings.embed_query(text)
+
+# Embeddings are cached by model and text hash, misses are embedded in batches
+embedding_model = "text-embedding-004"
+embedding_cache_path = "embedding_cache.sqlite"
+embedding_batch_size = 100  # Texts per embedding request
+embedding_concurrency = 4  # Embedding requests in flight
+
+@st.cache_resource
+def get_embeddings():
+    """Cached, batched embeddings shared by the index and the question lookups."""
+    backend = InstrumentedEmbeddings(embedding_model)
+    return CachedEmbeddings(backend, embedding_model, get_embedding_cache(embedding_cache_path),
+                            batch_size=embedding_batch_size, concurrency=embedding_concurrency)
+
+class MetricsCallback(BaseCallbackHandler):
+    """Record time to first token and token usage of the chat model into a metrics call."""
+
+    def __init__(self, call):
+        self.call = call
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.call.chunk()
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.call.prompt_tokens += usage.get("input_tokens", 0)
+                self.call.output_tokens += usage.get("output_tokens", 0)
+
+@st.cache_data(ttl=report_version_ttl, show_spinner=False)
+def get_report_versions(bucket_name):
+    """Versions of the analysis records and of the PDF, None for what does not exist."""
+    bucket = get_bucket(bucket_name, key_file_path)
+    pdf_blob = bucket.get_blob(source_blob_name)
+    return {
+        "records": records_version(bucket, records_prefix),
+        "pdf": None if pdf_blob is None else str(pdf_blob.generation),
+    }
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def fetch_pdf(bucket_name, source_blob_name, generation):
+    """Download the PDF once per generation, reruns reuse the local copy."""
+    return download_pdf_from_gcs(bucket_name, source_blob_name, destination_file_name)
 
 def download_pdf_from_gcs(bucket_name, source_blob_name, destination_file_name):
     """Download the PDF file from Google Cloud Storage, ensuring it's the latest version."""
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
+    bucket = get_bucket(bucket_name, key_file_path)
     blob = bucket.blob(source_blob_name)
 
     if os.path.exists(destination_file_name):
         os.remove(destination_file_name)  # Remove the old PDF if it exists
     
-    blob.download_to_filename(destination_file_name)
+    with get_metrics().call("storage", "download") as call:
+        blob.download_to_filename(destination_file_name)
+        call.bytes = os.path.getsize(destination_file_name)
     st.write(f"Downloaded the latest PDF from GCS: {source_blob_name}")
     return destination_file_name
 
+def get_video_catalog(bucket_name, analysis_folder):
+    """Listing of the analysis folder, re-listed incrementally once it is older than video_list_ttl."""
+    return get_blob_catalog(bucket_name, f"{analysis_folder}/", key_file_path, ttl=video_list_ttl)
+
 def list_video_files(bucket_name, analysis_folder):
-    """List video files in the specified Google Cloud Storage bucket and folder."""
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blobs = bucket.list_blobs(prefix=analysis_folder)
+    """List the recorded videos (video_*) of the folder and its camera subfolders."""
+    blobs = get_video_catalog(bucket_name, analysis_folder).list(suffix=('.mp4', '.avi', '.mkv'))
 
-    video_files = [blob.name for blob in blobs if blob.name.endswith(('.mp4', '.avi', '.mkv'))]
+    video_files = [blob.name for blob in blobs
+                   if os.path.basename(blob.name).startswith("video_")
+                   and blob.name[len(analysis_folder) + 1:].split("/")[0] not in derived_folders]
     return video_files
 
 def download_video_from_gcs(bucket_name, video_blob_name):
-    """Download a video file from Google Cloud Storage."""
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(video_blob_name)
-    local_video_path = f"/tmp/{os.path.basename(video_blob_name)}"
-    blob.download_to_filename(local_video_path)
-    return local_video_path
+    """Local copy of a video file from Google Cloud Storage, downloaded only if its generation is not cached.
+
+    None if the video was deleted since the video list was loaded.
+    """
+    from google.api_core.exceptions import NotFound
+
+    catalog = get_video_catalog(bucket_name, analysis_folder)
+    blob = catalog.blobs.get(video_blob_name) or catalog.bucket.get_blob(video_blob_name)
+    if blob is None or (is_local(catalog.bucket) and not blob.exists()):
+        return None
+    try:
+        return get_video_cache(video_cache_dir, video_cache_max_bytes).get(blob)
+    except NotFound:
+        return None  # Listed in the cached catalog but deleted from the bucket since
+
+@st.cache_data(ttl=signed_url_minutes * 60 // 2, show_spinner=False)
+def get_video_url(bucket_name, video_blob_name, generation):
+    """Signed URL of one generation of a video, the browser fetches it with byte-range requests."""
+    blob = get_video_catalog(bucket_name, analysis_folder).bucket.blob(video_blob_name, generation=generation)
+    return blob.generate_signed_url(version="v4", expiration=datetime.timedelta(minutes=signed_url_minutes),
+                                    method="GET")
+
+def load_analysis_records(bucket_name, records_prefix):
+    """Load the analysis records (Parquet rollup or JSONL batches) written by Script2."""
+    bucket = get_bucket(bucket_name, key_file_path)
+    with get_metrics().call("storage", "records"):
+        records = load_records(bucket, records_prefix, columns=["blob_name", "video_title", "created_time", "analysis"])
+    records["camera"] = records["blob_name"].map(get_camera)
+    return records
+
+@st.cache_resource(max_entries=1)
+def get_record_index(version):
+    """Records of one report version with precomputed flags, for questions answered without the model."""
+    return RecordIndex(load_analysis_records(bucket_name, records_prefix))
+
+def get_camera(blob_name):
+    """Camera of a video: its subfolder below the analysis folder, "default" for the folder itself."""
+    folder = os.path.dirname(blob_name[len(analysis_folder) + 1:]) if blob_name.startswith(f"{analysis_folder}/") else ""
+    return folder or "default"
+
+def get_records_documents(records):
+    """One document per video analysis, with the video's title, camera and created time as metadata."""
+    documents = []
+    for row in records.itertuples(index=False):
+        documents.append(Document(
+            page_content=f"Video Title: {row.video_title}\nCamera: {row.camera}\nCreated Time: {row.created_time}\n"
+                         f"Analysis: {row.analysis}",
+            metadata={
+                "video_title": row.video_title,
+                "blob_name": row.blob_name,
+                "camera": row.camera,
+                "created_time": row.created_time,
+                "created_date": row.created_time[:10],
+            },
+        ))
+    return documents
 
 def get_pdf_text(pdf_path):
     """Extract text from a PDF file."""
+    from PyPDF2 import PdfReader
+
     text = ""
     pdf_reader = PdfReader(pdf_path)
     for page in pdf_reader.pages:
@@ -91,6 +255,8 @@ def get_pdf_text(pdf_path):
 
 def get_text_chunks(text):
     """Split text into chunks for processing."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=10000, chunk_overlap=1000)
     chunks = text_splitter.split_text(text)
     return chunks
@@ -104,18 +270,93 @@ def extract_created_time(pdf_text):
             return line.replace("Created Time:", "").strip()
     return "No created time found."
 
-def get_vector_store(text_chunks):
-    """Create and save a vector store using FAISS."""
-    embeddings = VertexAIEmbeddings("text-embedding-004")
-    vector_store = FAISS.from_texts(text_chunks, embedding=embeddings)
-
-    vector_store.save_local("faiss_index")
-    st.write("Vector store created and saved.")
-
-def get_conversational_chain(created_time):
-    """Set up the conversational chain for question answering."""
+class ChatIndex:
+    """FAISS index of the report kept in memory across reruns, tagged with the report version."""
+
+    def __init__(self):
+        self.version = None
+        self.created_time = None
+        self.vector_store = None
+        self.document_ids = {}  # document key -> document id in the vector store
+        self.metadata = {}  # document id -> metadata, for filtering before the search
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def document_key(document):
+        return document.page_content + json.dumps(document.metadata, sort_keys=True)
+
+    def update(self, version, documents, created_time):
+        """Embed only documents that are new in this version and drop documents that are gone."""
+        documents = {self.document_key(document): document for document in documents}
+        new_keys = [key for key in documents if key not in self.document_ids]
+        removed_ids = [self.document_ids.pop(key) for key in set(self.document_ids) - set(documents)]
+
+        if new_keys:
+            from langchain_community.vectorstores import FAISS
+
+            ids = [str(uuid.uuid4()) for _ in new_keys]
+            new_documents = [documents[key] for key in new_keys]
+            if self.vector_store is None:
+                self.vector_store = FAISS.from_documents(new_documents, embedding=get_embeddings(), ids=ids)
+            else:
+                self.vector_store.add_documents(new_documents, ids=ids)
+            self.document_ids.update(zip(new_keys, ids))
+            self.metadata.update(zip(ids, (document.metadata for document in new_documents)))
+        if removed_ids and self.vector_store is not None:
+            self.vector_store.delete(removed_ids)
+            for document_id in removed_ids:
+                self.metadata.pop(document_id, None)
+
+        self.version = version
+        self.created_time = created_time
+        return len(new_keys), len(removed_ids)
+
+    def cameras(self):
+        return sorted({metadata["camera"] for metadata in self.metadata.values() if "camera" in metadata})
+
+    def search(self, question, k=4, start=None, end=None, cameras=None):
+        """Top k documents for the question among the videos created in [start, end] on the given cameras.
+
+        The filter is applied inside FAISS with an IDSelector, so all k results match it.
+        """
+        if start is None and end is None and not cameras:
+            return self.vector_store.similarity_search(question, k=k)
+
+        allowed = {
+            document_id for document_id, metadata in self.metadata.items()
+            if "created_time" in metadata
+            and (start is None or metadata["created_time"] >= start)
+            and (end is None or metadata["created_time"] <= end)
+            and (not cameras or metadata["camera"] in cameras)
+        }
+        positions = [position for position, document_id in self.vector_store.index_to_docstore_id.items()
+                     if document_id in allowed]
+        if not positions:
+            return []
+        import faiss
+
+        query = np.array([get_embeddings().embed_query(question)], dtype=np.float32)
+        selector = faiss.IDSelectorBatch(np.array(positions, dtype=np.int64))
+        _, found = self.vector_store.index.search(query, min(k, len(positions)),
+                                                  params=faiss.SearchParameters(sel=selector))
+        return [self.vector_store.docstore.search(self.vector_store.index_to_docstore_id[position])
+                for position in found[0] if position != -1]
+
+@st.cache_resource
+def get_chat_index():
+    """One chat index per process, shared by all sessions and reruns."""
+    return ChatIndex()
+
+def get_vector_store(chat_index, version, documents, created_time):
+    """Bring the in-memory FAISS vector store up to the given report version."""
+    added, removed = chat_index.update(version, documents, created_time)
+    st.write(f"Vector store updated: {added} documents embedded, {removed} removed.")
+
+@st.cache_resource
+def get_conversational_chain():
+    """Set up the conversational chain for question answering, once per process."""
     # Define the system's understanding of suspicious behavior and time handling
-    prompt_template = f"""
+    prompt_template = """
     You are analyzing video footage for suspicious behavior. The following actions should be flagged as suspicious:
     1. Anyone entering a cage/metal gate that holds electrical systems. This area is restricted, and no one should be inside unless authorized.
     2. Handling, lifting, or carrying a fire extinguisher unless there is a clear emergency or need. In non-emergency contexts, this is unusual.
@@ -129,50 +370,155 @@ def get_conversational_chain(created_time):
     Otherwise, answer the question as detailed as possible based on the provided context. If the answer is not in the provided context, say,
     "The answer is not available in the context."
     
-    Context:\n {{context}}\n
-    Question: \n{{question}}\n
+    Context:\n {context}\n
+    Question: \n{question}\n
 
     Answer:
     """
 
-    model = ChatVertexAI(model="gemini-1.5-pro", temperature=0.3)
-    prompt = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
-    chain = load_qa_chain(model, chain_type="stuff", prompt=prompt)
+    from langchain_core.prompts import PromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_google_vertexai import ChatVertexAI
 
-    return chain
-
-def user_input(user_question, created_time):
-    """Process user input and return an answer."""
-    embeddings = VertexAIEmbeddings("text-embedding-004")
-    
-    new_db = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
-    docs = new_db.similarity_search(user_question)
-
-    chain = get_conversational_chain(created_time)
+    init_vertex(vertex_project, vertex_location)
+    model = ChatVertexAI(model="gemini-1.5-pro", temperature=0.3, streaming=True)
+    prompt = PromptTemplate(template=prompt_template, input_variables=["context", "question", "created_time"])
+    chain = prompt | model | StrOutputParser()
 
-    response = chain({"input_documents": docs, "question": user_question}, return_only_outputs=True)
+    return chain
 
-    st.write("Reply: ", response["output_text"])
+class AnswerCache:
+    """Least recently used answers, shared by all sessions of the process."""
+
+    def __init__(self, size):
+        self.size = size
+        self.answers = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(question, version, *filters):
+        normalized = re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+        return (normalized, version, *filters)
+
+    def get(self, key):
+        with self.lock:
+            if key in self.answers:
+                self.answers.move_to_end(key)
+            return self.answers.get(key)
+
+    def put(self, key, answer):
+        with self.lock:
+            self.answers[key] = answer
+            self.answers.move_to_end(key)
+            while len(self.answers) > self.size:
+                self.answers.popitem(last=False)
+
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache(answer_cache_size)
+
+def get_search_filters(chat_index):
+    """Time range and cameras chosen in the sidebar, as (start, end, cameras)."""
+    with st.sidebar:
+        st.subheader("Search filters")
+        cameras = st.multiselect("Cameras", chat_index.cameras())
+        dates = st.date_input("Recorded between", value=())
+        start_time = st.time_input("From time", value=datetime.time(0, 0))
+        end_time = st.time_input("To time", value=datetime.time(23, 59))
+    start = end = None
+    if len(dates) == 2:
+        start = f"{dates[0]} {start_time.strftime('%H:%M')}:00"
+        end = f"{dates[1]} {end_time.strftime('%H:%M')}:59"
+    return start, end, cameras
+
+def user_input(user_question, chat_index, start=None, end=None, cameras=None, record_index=None):
+    """Process user input and stream the answer."""
+    # Counts, time windows and flag lookups are answered from the records in milliseconds
+    if record_index is not None:
+        with get_metrics().call("router", "local"):
+            answer = record_index.answer(user_question, start, end, cameras)
+        if answer is not None:
+            st.markdown(answer)
+            return
+
+    answer_cache = get_answer_cache()
+    cache_key = AnswerCache.key(user_question, chat_index.version, start, end, tuple(cameras or ()))
+    answer = answer_cache.get(cache_key)
+    if answer is not None:
+        st.write("Reply: ", answer)
+        return
+
+    with chat_index.lock:
+        docs = chat_index.search(user_question, k=retrieval_k, start=start, end=end, cameras=cameras)
+        created_time = chat_index.created_time
+
+    if not docs:
+        st.write("Reply: ", "No recordings match the selected filters.")
+        return
+
+    # Every retrieved video brings its own created time
+    video_times = [f"{doc.metadata['video_title']}: {doc.metadata['created_time']}"
+                   for doc in docs if "created_time" in doc.metadata]
+    if video_times:
+        created_time = "; ".join(video_times)
+
+    chain = get_conversational_chain()
+    inputs = {
+        "context": "\n\n".join(doc.page_content for doc in docs),
+        "question": user_question,
+        "created_time": created_time,
+    }
+
+    # Show the answer token by token as it arrives
+    st.write("Reply: ")
+    with get_metrics().call("chat", "gemini-1.5-pro") as call:
+        answer = st.write_stream(chain.stream(inputs, config={"callbacks": [MetricsCallback(call)]}))
+    answer_cache.put(cache_key, answer)
+
+def show_metrics_panel():
+    """Show the call metrics of this process in the sidebar."""
+    with st.sidebar.expander("Call metrics"):
+        summary = get_metrics().summary()
+        if summary:
+            st.dataframe(summary, hide_index=True)
+        else:
+            st.write("No calls yet.")
+        cache = get_embeddings().stats()
+        st.write(f"Embedding cache: {cache['hits']} hits, {cache['misses']} misses "
+                 f"({cache['hit_rate']:.0%}), {cache['batches']} requests")
 
 def main():
     st.header("Ask questions about the recordings 🙋🏻‍♀️")
 
-    # Always download the latest PDF from GCS
-    pdf_path = download_pdf_from_gcs(bucket_name, source_blob_name, destination_file_name)
-
-    # Extract text and generate chunks
-    pdf_text = get_pdf_text(pdf_path)
-    created_time = extract_created_time(pdf_text)  # Extract the created time
-    text_chunks = get_text_chunks(pdf_text)
-
-    # Generate and save the vector store (FAISS index) from the latest PDF
-    get_vector_store(text_chunks)
+    # The PDF is only downloaded again when its generation changed
+    versions = get_report_versions(bucket_name)
+    pdf_path = fetch_pdf(bucket_name, source_blob_name, versions["pdf"]) if versions["pdf"] else None
+
+    # The index is only rebuilt for a new report version, the structured records are used when Script2 wrote them
+    version = f"records:{versions['records']}" if versions["records"] else f"pdf:{versions['pdf']}"
+    chat_index = get_chat_index()
+    record_index = get_record_index(version) if versions["records"] else None
+    with chat_index.lock:
+        if chat_index.version != version and (versions["records"] or pdf_path):
+            if versions["records"]:
+                # One document per video, created times come from the metadata
+                documents = get_records_documents(record_index.records)
+                created_time = None
+            else:
+                pdf_text = get_pdf_text(pdf_path)
+                created_time = extract_created_time(pdf_text)  # Extract the created time
+                documents = [Document(page_content=chunk) for chunk in get_text_chunks(pdf_text)]
+
+            # Embed the documents that are new in this version of the report
+            get_vector_store(chat_index, version, documents, created_time)
+
+    start, end, cameras = get_search_filters(chat_index)
 
     # Ask questions based on the latest PDF
     user_question = st.text_input("Ask a Question from the PDF Files")
 
-    if user_question:
-        user_input(user_question, created_time)
+    if user_question and chat_index.vector_store is not None:
+        user_input(user_question, chat_index, start, end, cameras, record_index)
 
     # List available video files and create a dropdown
     video_files = list_video_files(bucket_name, analysis_folder)
@@ -180,17 +526,29 @@ def main():
     selected_video = st.selectbox("Select a video file to analyze", video_files)
 
     if selected_video:
-        local_video_path = download_video_from_gcs(bucket_name, selected_video)
-        st.video(local_video_path)
+        if video_playback == "signed_url" and not is_local(get_bucket(bucket_name, key_file_path)):
+            blob = get_video_catalog(bucket_name, analysis_folder).blobs.get(selected_video)
+            st.video(get_video_url(bucket_name, selected_video, blob.generation if blob else None))
+        else:
+            local_video_path = download_video_from_gcs(bucket_name, selected_video)
+            if local_video_path is None:
+                st.warning(f"The video {selected_video} is no longer available.")
+            else:
+                st.video(local_video_path)
 
     # Serve the PDF file as a downloadable link
-    with open(pdf_path, "rb") as pdf_file:
-        st.download_button(
-            label="Download PDF Report",
-            data=pdf_file,
-            file_name=pdf_filename,
-            mime="application/pdf"
-        )
+    if pdf_path:
+        with open(pdf_path, "rb") as pdf_file:
+            st.download_button(
+                label="Download PDF Report",
+                data=pdf_file,
+                file_name=pdf_filename,
+                mime="application/pdf"
+            )
+
+    serve_metrics(metrics_port)
+    finish_run(script_run)
+    show_metrics_panel()
 
 if __name__ == "__main__":
     main()
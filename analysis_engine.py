@@ -0,0 +1,112 @@
+# Concurrent, rate-limited model calls with retries on quota errors
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from core import cache_once, init_vertex
+from metrics import get_metrics
+
+
+# Token bucket shared by all worker threads of a process
+class TokenBucket:
+    """Allow on average `rate` calls per second with bursts of up to `capacity` calls."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Function to get the process wide rate limiter for a quota in requests per minute
+@cache_once
+def get_rate_limiter(requests_per_minute, burst=1):
+    return TokenBucket(requests_per_minute / 60.0, burst)
+
+
+# Function to create the Vertex AI model once per process, also when the first analysis threads start together
+@cache_once
+def get_generative_model(project, location, model_name):
+    from vertexai.generative_models import GenerativeModel
+
+    init_vertex(project, location)
+    return GenerativeModel(model_name)
+
+
+def is_rate_limited(error):
+    """True for 429 / quota exhausted errors from the Vertex AI SDK (by status code or exception type, not message)."""
+    code = getattr(error, "code", None)
+    return code == 429 or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+# Function to call fn(item) with the rate limiter, retrying 429 responses with jittered backoff
+def call_with_retries(fn, item, limiter=None, retries=5, base_delay=2.0, max_delay=60.0, counters=None,
+                      retry_metric=None):
+    """retry_metric is the (kind, name) of the call in the metrics, retries are counted there too."""
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return fn(item)
+        except Exception as e:
+            if attempt == retries or not is_rate_limited(e):
+                raise
+            if counters is not None:
+                counters["retries"] += 1
+            if retry_metric is not None:
+                get_metrics().count_retry(*retry_metric)
+            time.sleep(min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+# Function to run fn over items concurrently, keeping results in input order
+def run_concurrent(items, fn, concurrency=4, limiter=None, retries=5, on_result=None, retry_metric=None):
+    """Return ([(result, error), ...] in the order of items, throughput stats).
+
+    on_result(index, item, result, error) is called from the calling thread as soon as
+    each item finishes, so it may safely update the UI.
+    """
+    items = list(items)
+    results = [(None, None)] * len(items)
+    counters = {"retries": 0}
+    started = time.time()
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="analysis") as executor:
+        futures = {
+            executor.submit(call_with_retries, fn, item, limiter, retries, counters=counters,
+                            retry_metric=retry_metric): index
+            for index, item in enumerate(items)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                outcome = (future.result(), None)
+            except Exception as e:
+                outcome = (None, e)
+            results[index] = outcome
+            if on_result is not None:
+                on_result(index, items[index], *outcome)
+
+    elapsed = time.time() - started
+    stats = {
+        "items": len(items),
+        "failed": sum(1 for _, error in results if error is not None),
+        "retries": counters["retries"],
+        "seconds": elapsed,
+        "items_per_minute": len(items) / elapsed * 60 if elapsed > 0 else 0.0,
+    }
+    return results, stats
@@ -0,0 +1,95 @@
+# Machine-readable analysis records next to the PDF report: one JSONL file per analysis
+# batch plus a Parquet rollup of the latest analysis of every video
+
+import io
+import json
+from datetime import datetime
+
+record_columns = ["blob_name", "blob_version", "video_title", "created_time", "upload_time",
+                  "analyzed_at", "model", "prompt_hash", "analysis"]
+
+batches_folder = "batches"
+rollup_name = "analyses.parquet"
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def to_frame(records):
+    """DataFrame of records with created_at, the created time as a timestamp for range filters."""
+    import pandas as pd  # Imported on first use, the apps render without it
+
+    frame = pd.DataFrame(list(records), columns=record_columns)
+    frame["created_at"] = pd.to_datetime(frame["created_time"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    return frame
+
+
+def batch_blob_name(records_prefix):
+    return f"{records_prefix}/{batches_folder}/batch_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl"
+
+
+# Function to publish a batch and refresh the rollup, returns the names of the written blobs
+def publish_records(bucket, records_prefix, batch, all_records):
+    """batch holds the records analyzed in this run, all_records the latest one of every video."""
+    written = []
+    if batch:
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch)
+        name = batch_blob_name(records_prefix)
+        bucket.blob(name).upload_from_string(lines.encode("utf-8"), content_type="application/x-ndjson")
+        written.append(name)
+
+    # Without pyarrow consumers fall back to the JSONL batches
+    if parquet_available():
+        buffer = io.BytesIO()
+        to_frame(all_records).to_parquet(buffer, index=False)
+        name = f"{records_prefix}/{rollup_name}"
+        bucket.blob(name).upload_from_string(buffer.getvalue(), content_type="application/vnd.apache.parquet")
+        written.append(name)
+    return written
+
+
+def records_version(bucket, records_prefix):
+    """Version of the published records: rollup generation, or the newest batch without a rollup."""
+    rollup = bucket.get_blob(f"{records_prefix}/{rollup_name}")
+    if rollup is not None and parquet_available():
+        return f"rollup:{rollup.generation}"
+    batches = [blob.name for blob in bucket.list_blobs(prefix=f"{records_prefix}/{batches_folder}/")]
+    return f"batch:{max(batches)}" if batches else None
+
+
+# Function to load the analysis records of a bucket folder, newest analysis per video
+def load_records(bucket, records_prefix, columns=None, start=None, end=None):
+    """Read the Parquet rollup, or replay the JSONL batches if there is none.
+
+    columns limits the columns read, start / end (datetimes) the created time range.
+    """
+    import pandas as pd
+
+    rollup = bucket.get_blob(f"{records_prefix}/{rollup_name}")
+    if rollup is not None and parquet_available():
+        filters = []
+        if start is not None:
+            filters.append(("created_at", ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append(("created_at", "<", pd.Timestamp(end)))
+        read_columns = None if columns is None else list(dict.fromkeys([*columns, "created_at"]))
+        frame = pd.read_parquet(io.BytesIO(rollup.download_as_bytes()), columns=read_columns,
+                                filters=filters or None)
+    else:
+        records = []
+        for blob in sorted(bucket.list_blobs(prefix=f"{records_prefix}/{batches_folder}/"), key=lambda b: b.name):
+            if blob.name.endswith(".jsonl"):
+                records.extend(json.loads(line) for line in blob.download_as_text().splitlines() if line.strip())
+        frame = to_frame(records).drop_duplicates("blob_name", keep="last")
+        if start is not None:
+            frame = frame[frame["created_at"] >= pd.Timestamp(start)]
+        if end is not None:
+            frame = frame[frame["created_at"] < pd.Timestamp(end)]
+        if columns is not None:
+            frame = frame[list(dict.fromkeys([*columns, "created_at"]))]
+    return frame.sort_values("created_at", kind="stable").reset_index(drop=True)
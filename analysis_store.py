@@ -0,0 +1,105 @@
+# Persistent store of video analyses, so every run only analyzes new or changed videos
+
+import functools
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+
+
+def prompt_hash(prompt_text):
+    """Short, stable hash of the prompt, part of the cache key."""
+    return hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:16]
+
+
+def blob_version(blob):
+    """GCS generation plus md5, changes whenever the object is overwritten."""
+    return f"{blob.generation}:{blob.md5_hash}"
+
+
+# SQLite store keyed by blob name, blob version, model name and prompt hash
+class AnalysisStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                blob_name TEXT NOT NULL,
+                blob_version TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                video_title TEXT,
+                upload_time TEXT,
+                created_time TEXT,
+                analysis TEXT,
+                analyzed_at TEXT,
+                PRIMARY KEY (blob_name, blob_version, model, prompt_hash)
+            )
+        """)
+        self._connection.commit()
+
+    def known_keys(self, model, prompt_key):
+        """Set of (blob_name, blob_version) already analyzed with this model and prompt."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT blob_name, blob_version FROM analyses WHERE model = ? AND prompt_hash = ?",
+                (model, prompt_key),
+            ).fetchall()
+        return set(rows)
+
+    def save(self, blob_name, version, model, prompt_key, video_title, upload_time, created_time, analysis):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (blob_name, version, model, prompt_key, video_title, upload_time, created_time, analysis,
+                 datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+            self._connection.commit()
+
+    def report(self, model, prompt_key):
+        """Latest analysis of every video for this model and prompt, in the video_log layout."""
+        import pandas as pd  # Only reports need pandas, the apps render without it
+
+        with self._lock:
+            report = pd.read_sql_query(
+                """
+                SELECT video_title AS "Video Title", upload_time AS "Upload Time",
+                       created_time AS "Created Time", analysis AS "Analysis"
+                FROM analyses a
+                WHERE model = ? AND prompt_hash = ? AND rowid = (
+                    SELECT MAX(rowid) FROM analyses b
+                    WHERE b.blob_name = a.blob_name AND b.model = a.model AND b.prompt_hash = a.prompt_hash
+                )
+                ORDER BY created_time, blob_name
+                """,
+                self._connection,
+                params=(model, prompt_key),
+            )
+        return report
+
+    def records(self, model, prompt_key):
+        """Latest analysis of every video as plain dicts with all stored columns."""
+        with self._lock:
+            rows = self._connection.execute(
+                """
+                SELECT blob_name, blob_version, video_title, created_time, upload_time, analyzed_at,
+                       model, prompt_hash, analysis
+                FROM analyses a
+                WHERE model = ? AND prompt_hash = ? AND rowid = (
+                    SELECT MAX(rowid) FROM analyses b
+                    WHERE b.blob_name = a.blob_name AND b.model = a.model AND b.prompt_hash = a.prompt_hash
+                )
+                ORDER BY created_time, blob_name
+                """,
+                (model, prompt_key),
+            )
+            columns = [column[0] for column in rows.description]
+            return [dict(zip(columns, row)) for row in rows.fetchall()]
+
+
+# Function to get the process wide store for a database file
+@functools.lru_cache(maxsize=None)
+def get_analysis_store(path):
+    return AnalysisStore(path)
@@ -0,0 +1,82 @@
+# Benchmark of the embedding cache with the fake embedding backend
+#
+#   python benchmarks/bench_embedding_cache.py --texts 5000 --duplicates 0.3 --latency 0.2
+#
+# Compares embedding the texts one request per text (the old behaviour of from_texts with
+# a fresh client) with the cached, batched embeddings on a cold and on a warm cache, and
+# repeated questions through embed_query.
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import CachedEmbeddings, EmbeddingCache  # noqa: E402
+from fakes import FakeEmbeddings  # noqa: E402
+
+
+def make_texts(count, duplicates):
+    rng = random.Random(0)
+    unique = [f"Video Title: video_{index}.mp4\nAnalysis: a person walks to the shelf {index}" for index in range(count)]
+    return [rng.choice(unique[:index + 1]) if rng.random() < duplicates else text for index, text in enumerate(unique)]
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, round(time.perf_counter() - started, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=5000)
+    parser.add_argument("--duplicates", type=float, default=0.3, help="Share of texts that repeat an earlier text")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per embedding request")
+    parser.add_argument("--per-text-latency", type=float, default=0.002, help="Seconds per embedded text")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--sequential-sample", type=int, default=200,
+                        help="Texts embedded one per request to estimate the uncached baseline")
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts, args.duplicates)
+    results = {"texts": len(texts), "unique_texts": len(set(texts))}
+
+    baseline = FakeEmbeddings(latency=args.latency, per_text_latency=args.per_text_latency)
+    sample = texts[:args.sequential_sample]
+    _, seconds = timed(lambda: [baseline.embed_documents([text]) for text in sample])
+    results["uncached_one_per_request_seconds_estimate"] = round(seconds * len(texts) / len(sample), 1)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        backend = FakeEmbeddings(latency=args.latency, per_text_latency=args.per_text_latency)
+        cache = EmbeddingCache(os.path.join(work_dir, "embeddings.sqlite"))
+        embeddings = CachedEmbeddings(backend, "fake", cache, batch_size=args.batch_size,
+                                      concurrency=args.concurrency)
+
+        _, seconds = timed(embeddings.embed_documents, texts)
+        results["cold"] = {"seconds": seconds, "requests": backend.requests, **embeddings.stats()}
+
+        requests = backend.requests
+        _, seconds = timed(embeddings.embed_documents, texts)
+        results["warm"] = {"seconds": seconds, "requests": backend.requests - requests,
+                           "texts_per_second": round(len(texts) / seconds)}
+
+        rng = random.Random(1)
+        questions = [f"question {rng.randint(0, args.questions // 4)}" for _ in range(args.questions)]
+        requests, hits = backend.requests, embeddings.hits
+        _, seconds = timed(lambda: [embeddings.embed_query(question) for question in questions])
+        results["queries"] = {"questions": len(questions), "seconds": seconds,
+                              "requests": backend.requests - requests,
+                              "hit_rate": round((embeddings.hits - hits) / len(questions), 3)}
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+# End-to-end benchmark of the pipeline without Streamlit or Google Cloud
+#
+#   python benchmarks/bench_pipeline.py --scales 10,1000,10000 --output bench_pipeline.json
+#   python benchmarks/bench_pipeline.py --scales 10,1000 --baseline bench_pipeline.json
+#
+# Every stage runs the real code against deterministic stand-ins with injected latency:
+# a filesystem bucket that sleeps like GCS, and FakeGenerativeModel, FakeEmbeddings and
+# FakeChatChain (benchmarks/fakes.py) for the Vertex AI calls. Input videos are synthetic OpenCV videos.
+#
+#   capture    synthetic camera -> RecordingPipeline (h264 writer) -> bucket, frames/s
+#   upload     N short videos through uploads.upload_file
+#   listing    BlobCatalog full and incremental refresh
+#   analysis   Script2.analyze_videos (store, rate limiter, model calls, records), videos/min,
+#              per-video p50 / p95, then the rerun that finds everything analyzed
+#   records    load_records of the Parquet rollup
+#   report     Script2.save_analysis_to_pdf, skipped above --report-max-videos
+#   chat       Script3: RecordIndex build and routed questions through user_input, ChatIndex build
+#              (embedding and FAISS), search and filtered search p50 / p95, answers with a fake chain
+#
+# Each scale runs in its own process so its peak RSS is its own. The JSON result can be
+# passed back as --baseline, stages slower (or throughputs lower) than the baseline by
+# more than --tolerance are listed and the exit status is 1.
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+router_questions = [
+    "How many videos show people?",
+    "List the videos where someone is carrying something",
+    "Which videos mention a fire extinguisher?",
+    "How many videos are there?",
+]
+chat_questions = [
+    "Did anyone open the cage?",
+    "What did the worker do with the package?",
+    "Was the room empty at night?",
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+# Function to write a synthetic video: a moving square whose position depends on the seed
+def make_video(path, frames=10, width=64, height=48, fps=10.0, seed=0):
+    import cv2
+    import numpy as np
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    size = max(4, height // 4)
+    for index in range(frames):
+        frame = np.full((height, width, 3), (seed * 37) % 200, dtype=np.uint8)
+        x = (seed * 7 + index * 3) % (width - size)
+        y = (seed * 5 + index * 2) % (height - size)
+        frame[y:y + size, x:x + size] = (255, 255, 255)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def make_fake_gcs(root, latency, list_page_latency):
+    """LocalBucket that sleeps latency per object request and list_page_latency per listed page."""
+    from storage_backend import LocalBlob, LocalBucket
+
+    class FakeGcsBlob(LocalBlob):
+        def upload_from_filename(self, filename, content_type=None):
+            time.sleep(latency)
+            super().upload_from_filename(filename, content_type)
+
+        def upload_from_string(self, data, content_type=None):
+            time.sleep(latency)
+            super().upload_from_string(data, content_type)
+
+        def download_to_filename(self, filename):
+            time.sleep(latency)
+            super().download_to_filename(filename)
+
+        def download_as_bytes(self, start=None, end=None):
+            time.sleep(latency)
+            return super().download_as_bytes(start, end)
+
+        def delete(self):
+            time.sleep(latency)
+            super().delete()
+
+    class FakeGcsBucket(LocalBucket):
+        blob_class = FakeGcsBlob
+
+        def get_blob(self, blob_name):
+            time.sleep(latency)
+            return super().get_blob(blob_name)
+
+        def list_blobs(self, prefix=None, start_offset=None, page_size=None):
+            # Listed blobs come with their metadata, only every page costs a round trip
+            time.sleep(list_page_latency)
+            for index, blob in enumerate(super().list_blobs(prefix, start_offset)):
+                if index and index % (page_size or 1000) == 0:
+                    time.sleep(list_page_latency)
+                yield blob
+
+    return FakeGcsBucket(root)
+
+
+class Stages:
+    """Wall time and peak RSS after each stage, plus the stage's own measurements."""
+
+    def __init__(self):
+        self.results = {}
+
+    def run(self, name, fn, *args):
+        started = time.perf_counter()
+        measurements = fn(*args) or {}
+        self.results[name] = {"seconds": round(time.perf_counter() - started, 3), **measurements,
+                              "peak_rss_mb": peak_rss_mb()}
+        return self.results[name]
+
+
+# Stage: synthetic camera through the recording pipeline for a fixed time
+def bench_capture(args, work_dir, bucket):
+    from recorder import RecordingPipeline
+    from uploads import upload_file
+
+    source = make_video(os.path.join(work_dir, "camera.mp4"), frames=args.capture_frames,
+                        width=args.capture_width, height=args.capture_height, fps=args.capture_fps)
+
+    def upload_segment(local_file, destination_blob_name):
+        return upload_file(bucket, local_file, destination_blob_name, "video/mp4")
+
+    pipeline = RecordingPipeline(source, encode_fn=None, upload_fn=upload_segment, blob_prefix="capture",
+                                 segment_seconds=args.capture_segment_seconds, fps=args.capture_fps,
+                                 frame_width=args.capture_width, frame_height=args.capture_height,
+                                 writer_mode="h264")
+    pipeline.capture.reconnect_delay = 0  # The file source ends, reopen it at once like a live stream
+    pipeline.start()
+    time.sleep(args.capture_seconds)
+    pipeline.stop(wait=True)
+    stats = pipeline.stats()
+    return {
+        "frames_captured": stats["frames_captured"],
+        "frames_written": stats["frames_written"],
+        "frames_dropped": stats["frames_dropped"],
+        "captured_frames_per_second": round(stats["frames_captured"] / args.capture_seconds, 1),
+        "written_frames_per_second": round(stats["frames_written"] / args.capture_seconds, 1),
+        "segments_uploaded": stats["segments_uploaded"],
+        "segments_failed": stats["segments_failed"],
+    }
+
+
+# Stage: upload the synthetic videos like the recorder does
+def bench_upload(args, work_dir, bucket, video_paths, prefix):
+    from analysis_engine import run_concurrent
+    from uploads import upload_file
+
+    def upload(item):
+        index, path = item
+        started = time.perf_counter()
+        upload_file(bucket, path, f"{prefix}video_{index:06d}.mp4", "video/mp4")
+        return time.perf_counter() - started
+
+    results, stats = run_concurrent(list(enumerate(video_paths)), upload, concurrency=args.upload_workers)
+    latencies = [result for result, error in results if error is None]
+    return {"videos": len(latencies), "videos_per_minute": round(stats["items_per_minute"], 1),
+            "p50_seconds": round(percentile(latencies, 0.5), 4), "p95_seconds": round(percentile(latencies, 0.95), 4)}
+
+
+# Stage: full listing of the folder, then an incremental refresh that finds nothing new
+def bench_listing(bucket, prefix):
+    from blob_catalog import BlobCatalog
+
+    catalog = BlobCatalog(bucket, prefix, ttl=0)
+    started = time.perf_counter()
+    added = catalog.refresh(force=True)
+    full = time.perf_counter() - started
+    started = time.perf_counter()
+    catalog.refresh()
+    incremental = time.perf_counter() - started
+    return {"blobs": added, "full_seconds": round(full, 3), "incremental_seconds": round(incremental, 4)}
+
+
+# Stage: Script2's analysis of every new video, then the rerun that reuses the stored analyses
+def bench_analysis(args, script2):
+    latencies = []
+    analyze_video = script2.analyze_video
+
+    def timed_analyze_video(video_filename, prompt_text):
+        started = time.perf_counter()
+        result = analyze_video(video_filename, prompt_text)
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    script2.analyze_video = timed_analyze_video
+    try:
+        started = time.perf_counter()
+        report = script2.analyze_videos(script2.default_prompt)
+        seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        script2.get_blob_catalog.cache_clear()  # The rerun lists the bucket again
+        script2.analyze_videos(script2.default_prompt)
+        rerun = time.perf_counter() - started
+    finally:
+        script2.analyze_video = analyze_video
+    return {
+        "videos": len(latencies),
+        "analyses_stored": len(report),
+        "videos_per_minute": round(len(latencies) / seconds * 60, 1) if seconds else 0.0,
+        "p50_seconds": round(percentile(latencies, 0.5), 4),
+        "p95_seconds": round(percentile(latencies, 0.95), 4),
+        "rerun_seconds": round(rerun, 3),
+    }
+
+
+def bench_records(bucket, records_prefix):
+    from analysis_records import load_records
+
+    records = load_records(bucket, records_prefix)
+    return {"records": len(records)}
+
+
+def bench_report(script2):
+    from analysis_store import get_analysis_store
+
+    store = get_analysis_store(script2.analysis_store_path)
+    script2.save_analysis_to_pdf(store.report(script2.model_name, script2.analysis_key(script2.default_prompt)))
+    return {"parts": len(os.listdir(script2.report_parts_dir)) if os.path.isdir(script2.report_parts_dir) else 0}
+
+
+# Stage: Script3's chat side, routed questions through user_input, the ChatIndex build and its searches
+def bench_chat(args, work_dir, bucket, records_prefix, model):
+    from embedding_cache import CachedEmbeddings, EmbeddingCache
+    from fakes import FakeChatChain, FakeEmbeddings
+    from query_router import RecordIndex
+
+    # Script3 renders its logo while it is imported
+    with open(os.path.join(work_dir, "logo.svg"), "w", encoding="utf-8") as file:
+        file.write('<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10"></svg>')
+    import Script3
+
+    backend = FakeEmbeddings(dimensions=args.dimensions, latency=args.embedding_latency,
+                             per_text_latency=args.embedding_per_text_latency)
+    embeddings = CachedEmbeddings(backend, "fake", EmbeddingCache(os.path.join(work_dir, "embeddings.sqlite")))
+    Script3.get_bucket = lambda *_: bucket
+    Script3.get_embeddings = lambda: embeddings
+    Script3.get_conversational_chain = lambda: FakeChatChain(model)
+
+    records = Script3.load_analysis_records(Script3.bucket_name, records_prefix)
+    started = time.perf_counter()
+    record_index = RecordIndex(records)
+    index_seconds = time.perf_counter() - started
+    chat_index = Script3.ChatIndex()
+
+    router_latencies = []
+    for question in router_questions * args.query_repeats:
+        started = time.perf_counter()
+        Script3.user_input(question, chat_index, record_index=record_index)
+        router_latencies.append(time.perf_counter() - started)
+    result = {
+        "record_index_seconds": round(index_seconds, 3),
+        "router_p50_seconds": round(percentile(router_latencies, 0.5), 4),
+        "router_p95_seconds": round(percentile(router_latencies, 0.95), 4),
+    }
+
+    started = time.perf_counter()
+    try:
+        chat_index.update("bench", Script3.get_records_documents(records), None)
+    except ImportError as e:
+        result["skipped"] = f"vector search: {e}"  # langchain_community or faiss not installed
+        return result
+    result["index_build_seconds"] = round(time.perf_counter() - started, 3)
+    result["embedding_requests"] = backend.requests
+
+    # Unfiltered and camera filtered searches, then full answers (the first round misses the answer cache)
+    cameras = chat_index.cameras()[:1]
+    search_latencies, filtered_latencies, answer_latencies = [], [], []
+    for question in chat_questions * args.query_repeats:
+        started = time.perf_counter()
+        chat_index.search(question, k=Script3.retrieval_k)
+        search_latencies.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        chat_index.search(question, k=Script3.retrieval_k, cameras=cameras)
+        filtered_latencies.append(time.perf_counter() - started)
+    for question in chat_questions:
+        started = time.perf_counter()
+        Script3.user_input(question, chat_index, record_index=record_index)
+        answer_latencies.append(time.perf_counter() - started)
+
+    result.update({
+        "search_p50_seconds": round(percentile(search_latencies, 0.5), 4),
+        "search_p95_seconds": round(percentile(search_latencies, 0.95), 4),
+        "filtered_search_p50_seconds": round(percentile(filtered_latencies, 0.5), 4),
+        "filtered_search_p95_seconds": round(percentile(filtered_latencies, 0.95), 4),
+        "answer_p50_seconds": round(percentile(answer_latencies, 0.5), 4),
+    })
+    return result
+
+
+# One scale in this process: every stage against a fresh fake bucket in a temporary directory
+def run_scale(args):
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)  # Script2 keeps its store, report parts and metrics file in the working directory
+        import Script2
+        import storage_backend
+        from fakes import FakeGenerativeModel
+        from metrics import configure_metrics
+
+        bucket = make_fake_gcs(os.path.join(work_dir, "bucket"), args.storage_latency, args.list_page_latency)
+        model = FakeGenerativeModel(first_chunk_latency=args.first_chunk_latency, chunk_latency=args.chunk_latency)
+        Script2.get_bucket = storage_backend.get_bucket = lambda *_: bucket
+        Script2.get_generative_model = lambda *_: model
+        Script2.requests_per_minute = args.requests_per_minute
+        Script2.analysis_concurrency = args.concurrency
+        configure_metrics(os.path.join(work_dir, "metrics.jsonl"))
+
+        stages = Stages()
+        if args.capture_seconds > 0:
+            stages.run("capture", bench_capture, args, work_dir, bucket)
+
+        video_dir = os.path.join(work_dir, "videos")
+        os.makedirs(video_dir)
+        started = time.perf_counter()
+        video_paths = [make_video(os.path.join(video_dir, f"{index}.mp4"), seed=index) for index in range(args.videos)]
+        prepare_seconds = round(time.perf_counter() - started, 3)
+
+        stages.run("upload", bench_upload, args, work_dir, bucket, video_paths, Script2.video_prefix)
+        stages.run("listing", bench_listing, bucket, Script2.video_prefix)
+        stages.run("analysis", bench_analysis, args, Script2)
+        stages.run("records", bench_records, bucket, Script2.records_folder)
+        if args.videos <= args.report_max_videos:
+            stages.run("report", bench_report, Script2)
+        stages.run("chat", bench_chat, args, work_dir, bucket, Script2.records_folder, model)
+        os.chdir(repo_dir)
+
+    return {
+        "videos": args.videos,
+        "prepare_seconds": prepare_seconds,
+        "model_calls": model.calls,
+        "stages": stages.results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# Function to list the measurements that got worse than the baseline by more than tolerance
+def compare(results, baseline, tolerance):
+    regressions = []
+    for scale, result in results["scales"].items():
+        base = baseline.get("scales", {}).get(scale)
+        if base is None:
+            continue
+        for stage, values in result["stages"].items():
+            base_values = base["stages"].get(stage, {})
+            for key, value in values.items():
+                old = base_values.get(key)
+                if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old <= 0:
+                    continue
+                # Differences below 50 ms are timer noise on the small stages
+                if key.endswith("seconds") and value > old * (1 + tolerance) and value - old > 0.05:
+                    regressions.append(f"{scale} videos, {stage} {key}: {old} -> {value}")
+                elif key.endswith("per_minute") or key.endswith("per_second"):
+                    if value < old * (1 - tolerance):
+                        regressions.append(f"{scale} videos, {stage} {key}: {old} -> {value}")
+                elif key == "peak_rss_mb" and value > old * (1 + tolerance):
+                    regressions.append(f"{scale} videos, {stage} {key}: {old} -> {value}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", default="10,1000,10000", help="Comma separated numbers of videos")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before flagging")
+    parser.add_argument("--concurrency", type=int, default=16, help="Analysis threads")
+    parser.add_argument("--upload-workers", type=int, default=8)
+    parser.add_argument("--requests-per-minute", type=float, default=60000)
+    parser.add_argument("--first-chunk-latency", type=float, default=0.05, help="Seconds to the first model chunk")
+    parser.add_argument("--chunk-latency", type=float, default=0.01, help="Seconds per further model chunk")
+    parser.add_argument("--storage-latency", type=float, default=0.005, help="Seconds per storage operation")
+    parser.add_argument("--list-page-latency", type=float, default=0.05, help="Seconds per listed page of 1000")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="Seconds per embedding request")
+    parser.add_argument("--embedding-per-text-latency", type=float, default=0.001)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--query-repeats", type=int, default=10)
+    parser.add_argument("--report-max-videos", type=int, default=1000, help="Skip the PDF report above this")
+    parser.add_argument("--capture-seconds", type=float, default=5, help="0 skips the capture stage")
+    parser.add_argument("--capture-frames", type=int, default=200)
+    parser.add_argument("--capture-width", type=int, default=640)
+    parser.add_argument("--capture-height", type=int, default=360)
+    parser.add_argument("--capture-fps", type=float, default=20.0)
+    parser.add_argument("--capture-segment-seconds", type=float, default=2.0)
+    parser.add_argument("--videos", type=int, help=argparse.SUPPRESS)  # Set for the per-scale processes
+    args, _ = parser.parse_known_args()
+
+    if args.videos is not None:
+        print(json.dumps(run_scale(args)))
+        return
+
+    results = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "settings": vars(args).copy(), "scales": {}}
+    for scale in [int(value) for value in args.scales.split(",")]:
+        command = [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--videos", str(scale)]
+        completed = subprocess.run(command, stdout=subprocess.PIPE, check=True, text=True)
+        results["scales"][str(scale)] = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(f"{scale} videos: {json.dumps(results['scales'][str(scale)], indent=2)}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Benchmark of PDF report rendering
+#
+#   python benchmarks/bench_report.py --rows 10000 [--monolithic]
+#
+# Compares a cold build of the part-based report, an incremental build after new rows
+# were added and the assembly of the combined PDF. --monolithic also times the old single
+# Table report for the same rows, which is slow for large row counts.
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.lib.pagesizes import letter  # noqa: E402
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Table  # noqa: E402
+
+from report import ReportBuilder, column_widths, report_columns, small_style, table_style  # noqa: E402
+
+words = "person enters room walks to the shelf takes a box carries it out no people cage door fire extinguisher".split()
+
+
+def make_rows(count, start=0, rows_per_day=1000):
+    rng = random.Random(start)
+    rows = []
+    for index in range(start, start + count):
+        day = index // rows_per_day
+        created = f"2024-{1 + day // 28:02d}-{1 + day % 28:02d} {index % 24:02d}:{index % 60:02d}:00"
+        rows.append({
+            "Video Title": f"video_{index}.mp4",
+            "Upload Time": created,
+            "Created Time": created,
+            "Analysis": " ".join(rng.choice(words) for _ in range(rng.randint(40, 250))),
+        })
+    return pd.DataFrame(rows, columns=report_columns)
+
+
+# Function to run fn and return (result, seconds, peak traced MB)
+def measure(fn, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    tracemalloc.stop()
+    return result, round(elapsed, 3), round(peak, 1)
+
+
+# The report as it used to be built: every row in one Table
+def render_monolithic(video_log, pdf_path):
+    data = [report_columns]
+    for row in video_log[report_columns].astype(str).values.tolist():
+        data.append([Paragraph(value, small_style) for value in row])
+    table = Table(data, colWidths=column_widths)
+    table.setStyle(table_style)
+    SimpleDocTemplate(pdf_path, pagesize=letter).build([table])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--new-rows", type=int, default=100)
+    parser.add_argument("--rows-per-part", type=int, default=500)
+    parser.add_argument("--monolithic", action="store_true")
+    args = parser.parse_args()
+
+    video_log = make_rows(args.rows)
+    results = {"rows": args.rows}
+    with tempfile.TemporaryDirectory() as work_dir:
+        builder = ReportBuilder(os.path.join(work_dir, "parts"), rows_per_part=args.rows_per_part)
+        combined = os.path.join(work_dir, "report.pdf")
+
+        (parts, rendered), seconds, peak = measure(builder.build, video_log)
+        results["cold_build"] = {"seconds": seconds, "peak_mb": peak, "parts": len(parts), "rendered": rendered}
+
+        _, seconds, peak = measure(builder.assemble, parts, combined)
+        results["assemble"] = {"seconds": seconds, "peak_mb": peak, "bytes": os.path.getsize(combined)}
+
+        video_log = pd.concat([video_log, make_rows(args.new_rows, args.rows)], ignore_index=True)
+        (parts, rendered), seconds, peak = measure(builder.build, video_log)
+        results["incremental_build"] = {"seconds": seconds, "peak_mb": peak, "parts": len(parts),
+                                        "rendered": rendered, "new_rows": args.new_rows}
+
+        if args.monolithic:
+            _, seconds, peak = measure(render_monolithic, video_log, os.path.join(work_dir, "monolithic.pdf"))
+            results["monolithic"] = {"seconds": seconds, "peak_mb": peak}
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# Startup benchmark of the three Streamlit apps
+#
+#   python benchmarks/bench_startup.py --reruns 20 --output bench_startup.json
+#
+# Every app runs in a fresh process with Streamlit's AppTest and the local storage backend
+# (empty bucket), so no cloud credentials are needed. Measured per app:
+#
+#   import_seconds     cold import of the app's own modules with Streamlit already loaded, the
+#                      delay before the first element renders in a fresh server process
+#   first_run_seconds  first script run of a session, cold imports included (first paint)
+#   rerun p50 / p95    later reruns of the same session (every widget interaction)
+#   heavy_modules      SDKs that got imported without being used
+#
+# Buttons are not clicked, so this is the overhead of rendering the page, not of the work.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+apps = ["Script1.py", "Script2.py", "Script3.py"]
+heavy_modules = ["vertexai", "langchain_google_vertexai", "langchain_community", "faiss", "PyPDF2", "reportlab",
+                 "google.cloud.storage", "google.cloud.aiplatform"]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+# One app in this process: first run and reruns in a scratch working directory
+def run_app(app, reruns, timeout):
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.environ["STORAGE_BACKEND"] = "local"
+        os.environ["LOCAL_STORAGE_ROOT"] = os.path.join(work_dir, "storage")
+        if os.path.exists(os.path.join(repo_dir, "logo.svg")):
+            os.symlink(os.path.join(repo_dir, "logo.svg"), os.path.join(work_dir, "logo.svg"))
+        else:
+            with open(os.path.join(work_dir, "logo.svg"), "w", encoding="utf-8") as file:
+                file.write('<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10"></svg>')
+        os.chdir(work_dir)  # Stores, spools and metrics files of the app stay in the scratch directory
+        sys.path.insert(0, repo_dir)
+
+        started = time.perf_counter()
+        from streamlit.testing.v1 import AppTest
+        streamlit_seconds = time.perf_counter() - started
+
+        at = AppTest.from_file(os.path.join(repo_dir, app), default_timeout=timeout)
+        started = time.perf_counter()
+        at.run()
+        first_run = time.perf_counter() - started
+        errors = [str(exception.value) for exception in at.exception]
+
+        rerun_times = []
+        for _ in range(reruns):
+            started = time.perf_counter()
+            at.run()
+            rerun_times.append(time.perf_counter() - started)
+        os.chdir(repo_dir)
+
+    return {
+        "streamlit_import_seconds": round(streamlit_seconds, 3),
+        "first_run_seconds": round(first_run, 3),
+        "rerun_p50_seconds": round(percentile(rerun_times, 0.5), 4),
+        "rerun_p95_seconds": round(percentile(rerun_times, 0.95), 4),
+        "heavy_modules": [name for name in heavy_modules if name in sys.modules],
+        "errors": errors,
+    }
+
+
+# Cold import of an app's modules, without running it
+def import_seconds(app):
+    code = (
+        "import ast, sys, time\n"
+        "import streamlit\n"
+        f"sys.path.insert(0, {repo_dir!r})\n"
+        f"tree = ast.parse(open({os.path.join(repo_dir, app)!r}).read())\n"
+        "names = [alias.name for node in tree.body if isinstance(node, ast.Import) for alias in node.names]\n"
+        "names += [node.module for node in tree.body if isinstance(node, ast.ImportFrom) and node.module]\n"
+        "started = time.perf_counter()\n"
+        "failed = []\n"
+        "for name in names:\n"
+        "    try:\n"
+        "        __import__(name)\n"
+        "    except ImportError:\n"
+        "        failed.append(name)\n"
+        "print(round(time.perf_counter() - started, 3), ' '.join(failed))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, text=True, check=True,
+                            cwd=repo_dir).stdout.split()
+    return float(output[0]), output[1:]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apps", default=",".join(apps))
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds per script run")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--app", help=argparse.SUPPRESS)  # Set for the per-app processes
+    args = parser.parse_args()
+
+    if args.app:
+        print(json.dumps(run_app(args.app, args.reruns, args.timeout)))
+        return
+
+    results = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "apps": {}}
+    for app in args.apps.split(","):
+        seconds, missing = import_seconds(app)
+        command = [sys.executable, os.path.abspath(__file__), "--app", app, "--reruns", str(args.reruns),
+                   "--timeout", str(args.timeout)]
+        completed = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True)
+        results["apps"][app] = {"import_seconds": seconds, "missing_modules": missing,
+                                **json.loads(completed.stdout.strip().splitlines()[-1])}
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
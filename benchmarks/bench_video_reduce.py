@@ -0,0 +1,78 @@
+# Benchmark of the video pre-reduction stage on synthetic clips
+#
+#   python benchmarks/bench_video_reduce.py --clips 3 --seconds 30
+#
+# Each clip is a mostly static 1280x720 scene with a few seconds of motion, encoded like
+# the recorder does. The output compares bytes to upload and video seconds the model
+# has to process for the original and the reduced proxy.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recorder import H264SegmentWriter  # noqa: E402
+from video_reduce import reduce_video  # noqa: E402
+
+
+# Function to write a synthetic clip with motion during the given (start, end) seconds
+def make_clip(path, seconds, fps, motion_spans, size=(1280, 720)):
+    width, height = size
+    rng = np.random.default_rng(0)
+    background = rng.integers(60, 120, (height, width, 3), dtype=np.uint8)
+    writer = H264SegmentWriter(path, fps, size)
+    for index in range(int(seconds * fps)):
+        timestamp = index / fps
+        frame = background.copy()
+        for start, end in motion_spans:
+            if start <= timestamp < end:
+                x = int((timestamp - start) / (end - start) * (width - 200))
+                cv2.rectangle(frame, (x, 200), (x + 200, 500), (240, 240, 240), -1)
+        writer.write(frame)
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clips", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--fps", type=float, default=20)
+    parser.add_argument("--proxy-fps", type=float, default=1.0)
+    parser.add_argument("--proxy-width", type=int, default=640)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for clip in range(args.clips):
+            original = os.path.join(work_dir, f"video_{clip}.mp4")
+            proxy = os.path.join(work_dir, f"proxy_{clip}.mp4")
+            span_start = args.seconds * (clip + 1) / (args.clips + 2)
+            make_clip(original, args.seconds, args.fps, [(span_start, span_start + 5)])
+
+            started = time.perf_counter()
+            reduction = reduce_video(original, proxy, target_fps=args.proxy_fps, max_width=args.proxy_width)
+            elapsed = time.perf_counter() - started
+            results.append({
+                "clip": os.path.basename(original),
+                "original_bytes": os.path.getsize(original),
+                "proxy_bytes": os.path.getsize(proxy),
+                "original_seconds": round(reduction["original_seconds"], 2),
+                "proxy_seconds": round(reduction["proxy_seconds"], 2),
+                "reduce_seconds": round(elapsed, 3),
+            })
+
+    totals = {key: round(sum(result[key] for result in results), 3) for key in results[0] if key != "clip"}
+    totals["bytes_ratio"] = round(totals["proxy_bytes"] / totals["original_bytes"], 3)
+    totals["seconds_ratio"] = round(totals["proxy_seconds"] / totals["original_seconds"], 3)
+    print(json.dumps({"clips": results, "totals": totals}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Deterministic offline stand-ins for the Vertex AI model and embeddings, used by the benchmarks
+
+import hashlib
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+# Stand-in for the Vertex AI GenerativeModel
+class FakeGenerativeModel:
+    """Deterministic analyses derived from a hash of the contents, with simulated latency.
+
+    first_chunk_latency is paid before the first streamed chunk, chunk_latency before each
+    further one. Token counts are estimated from the text like in the usage metadata.
+    """
+
+    sentences = [
+        "A person walks in from the left and stops at the shelf.",
+        "There is no people in the video.",
+        "A man is carrying a box toward the exit.",
+        "A woman takes a fire extinguisher from the wall.",
+        "Someone opens the metal gate of the cage and leaves it open.",
+        "The room is empty and the lights are on.",
+        "A worker lifts a package onto the table at 00:12.",
+        "Two people talk near the door at 00:34 and leave together.",
+    ]
+
+    def __init__(self, first_chunk_latency=0.0, chunk_latency=0.0, chunks=5, sentences_per_chunk=2):
+        self.first_chunk_latency = first_chunk_latency
+        self.chunk_latency = chunk_latency
+        self.chunks = chunks
+        self.sentences_per_chunk = sentences_per_chunk
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _chunks(self, contents):
+        digest = hashlib.sha256()
+        for content in contents:
+            digest.update(content.encode("utf-8") if isinstance(content, str) else repr(content).encode("utf-8"))
+        rng = random.Random(digest.digest())
+        prompt_tokens = sum(len(str(content)) for content in contents) // 4
+        output_tokens = 0
+        for index in range(self.chunks):
+            time.sleep(self.first_chunk_latency if index == 0 else self.chunk_latency)
+            text = " ".join(rng.choice(self.sentences) for _ in range(self.sentences_per_chunk)) + " "
+            output_tokens += len(text) // 4
+            usage = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=output_tokens)
+            yield SimpleNamespace(text=text, usage_metadata=usage)
+
+    def generate_content(self, contents, safety_settings=None, stream=False):
+        with self._lock:
+            self.calls += 1
+        if stream:
+            return self._chunks(contents)
+        chunks = list(self._chunks(contents))
+        return SimpleNamespace(text="".join(chunk.text for chunk in chunks), usage_metadata=chunks[-1].usage_metadata)
+
+
+# Offline stand-in for Vertex AI embeddings
+class FakeEmbeddings(Embeddings):
+    """Deterministic vectors derived from a hash of the text, with simulated request latency.
+
+    latency is paid once per request, per_text_latency for every text in it.
+    """
+
+    def __init__(self, dimensions=768, latency=0.0, per_text_latency=0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.requests = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.requests += 1
+            self.texts += len(texts)
+        time.sleep(self.latency + self.per_text_latency * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+# Stand-in for Script3's prompt | ChatVertexAI | StrOutputParser chain, answers come from a FakeGenerativeModel
+class FakeChatChain:
+    def __init__(self, model):
+        self.model = model
+
+    def stream(self, inputs, config=None):
+        for chunk in self.model.generate_content([inputs["context"], inputs["question"]], stream=True):
+            yield chunk.text
@@ -0,0 +1,109 @@
+# Cached, incrementally refreshed listing of a bucket folder, indexed by blob name
+
+import functools
+import re
+import threading
+import time
+
+import pytz
+
+# Names of recorded segments (recorder.segment_name), the only names that move a folder's listing offset
+segment_name_pattern = r"video_\d{8}_\d{6}_\d+\.mp4"
+
+# Define the timezone for Berlin (UTC+2)
+berlin_timezone = pytz.timezone('Europe/Berlin')
+
+
+def format_created_time(blob):
+    """Created time of a blob in Berlin time, "Not available" if GCS did not return one."""
+    if not blob.time_created:
+        return "Not available"
+    created_time_utc = blob.time_created.replace(tzinfo=pytz.UTC)
+    return created_time_utc.astimezone(berlin_timezone).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class BlobCatalog:
+    """Listing of a bucket prefix that is only re-listed when it is older than ttl seconds.
+
+    GCS lists names in lexicographic order and the recorders name segments after their
+    start time, so within a folder (the prefix itself or a camera subfolder) new segments
+    sort after the ones already seen. A refresh lists every known folder from its last
+    segment name on (start_offset), other names (reports, records, old video_<counter>.mp4
+    names) do not move that offset because they may sort after later segments. New folders,
+    other new names and overwritten objects are picked up by a full listing every
+    full_refresh seconds.
+    """
+
+    def __init__(self, bucket, prefix, ttl=60, full_refresh=600, page_size=1000):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ttl = ttl
+        self.full_refresh = full_refresh
+        self.page_size = page_size
+        self.blobs = {}  # blob name -> blob
+        self.created_times = {}  # blob name -> formatted created time
+        self._last_names = {}  # folder -> last segment name seen in it (listing offset)
+        self._refreshed = 0.0
+        self._fully_refreshed = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Bring the catalog up to date if it is older than the TTL, return the number of new blobs."""
+        with self._lock:
+            now = time.time()
+            if not force and now - self._refreshed < self.ttl:
+                return 0
+
+            full = force or not self._last_names or now - self._fully_refreshed >= self.full_refresh
+            if full:
+                listings = [self.bucket.list_blobs(prefix=self.prefix, page_size=self.page_size)]
+                # Rebuilt from the listing, deleted folders are dropped
+                self._last_names = {self.prefix: f"{self.prefix}video_"}
+            else:
+                listings = [self.bucket.list_blobs(prefix=folder, start_offset=last_name, page_size=self.page_size)
+                            for folder, last_name in list(self._last_names.items())]
+
+            seen = set()
+            added = 0
+            for blob in (blob for listed in listings for blob in listed):
+                seen.add(blob.name)
+                known = self.blobs.get(blob.name)
+                if known is None or known.generation != blob.generation:
+                    added += known is None
+                    self.blobs[blob.name] = blob
+                    self.created_times[blob.name] = format_created_time(blob)
+                folder = blob.name[:blob.name.rfind("/") + 1]
+                is_segment = re.fullmatch(segment_name_pattern, blob.name[len(folder):])
+                if is_segment and blob.name > self._last_names.get(folder, ""):
+                    self._last_names[folder] = blob.name
+
+            if full:
+                # Forget blobs that were deleted from the bucket
+                for name in set(self.blobs) - seen:
+                    del self.blobs[name]
+                    del self.created_times[name]
+                self._fully_refreshed = now
+            self._refreshed = now
+            return added
+
+    def created_time(self, name):
+        return self.created_times.get(name, "Not available")
+
+    def list(self, suffix="", name_prefix=""):
+        """Blobs whose file name matches, sorted by creation time (oldest first)."""
+        self.refresh()
+        with self._lock:
+            blobs = [
+                blob for name, blob in self.blobs.items()
+                if name.endswith(suffix) and name[len(self.prefix):].startswith(name_prefix)
+            ]
+        return sorted(blobs, key=lambda blob: (blob.time_created is None, blob.time_created, blob.name))
+
+
+# Function to get the process wide catalog of a bucket folder (kept across Streamlit reruns)
+@functools.lru_cache(maxsize=None)
+def get_blob_catalog(bucket_name, prefix, key_file_path=None, ttl=60, full_refresh=600):
+    from storage_backend import get_bucket
+
+    bucket = get_bucket(bucket_name, key_file_path)
+    return BlobCatalog(bucket, prefix, ttl=ttl, full_refresh=full_refresh)
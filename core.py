@@ -0,0 +1,53 @@
+# Startup shared by the apps: heavy SDKs (Vertex AI, LangChain, FAISS, PyPDF2, reportlab)
+# are imported where they are first used, clients and static files are created once per
+# process, and every script run is timed into the metrics (cold start vs. rerun).
+
+import functools
+import threading
+
+from metrics import Call, get_metrics
+
+_started_apps = set()
+_lock = threading.Lock()
+
+
+# Decorator like functools.lru_cache(maxsize=None) that also builds every value only once when several
+# threads miss at the same time (lru_cache alone lets each of them call the function)
+def cache_once(function):
+    cached = functools.lru_cache(maxsize=None)(function)
+    lock = threading.RLock()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with lock:
+            return cached(*args, **kwargs)
+
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+
+# Function to read a static file (the logo) once per process instead of on every rerun
+@functools.lru_cache(maxsize=None)
+def read_asset(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+# Function to initialize the Vertex AI SDK once per process, on the first model or embedding call
+@cache_once
+def init_vertex(project, location):
+    import vertexai
+
+    vertexai.init(project=project, location=location)
+
+
+def start_run(app):
+    """Start timing a script run, the first run of the app in this process counts as its cold start."""
+    with _lock:
+        first = app not in _started_apps
+        _started_apps.add(app)
+    return Call("app", f"{app} {'cold start' if first else 'rerun'}")
+
+
+def finish_run(call):
+    get_metrics().record(call)
@@ -0,0 +1,141 @@
+# Content-addressed embedding cache: vectors are stored in SQLite under a hash of model,
+# task and text, so identical chunks and repeated questions are only embedded once.
+# Cache misses are embedded in batches with limited concurrency.
+
+import functools
+import hashlib
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from analysis_engine import run_concurrent
+
+
+def text_key(model_name, task, text):
+    """Cache key of a text, documents and queries are embedded differently by Vertex AI."""
+    return hashlib.sha256(f"{model_name}\0{task}\0{text}".encode("utf-8")).hexdigest()
+
+
+# SQLite table of key -> float32 vector
+class EmbeddingCache:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL
+            )
+        """)
+        self._connection.commit()
+
+    def get_many(self, keys):
+        """{key: vector} for the keys that are cached."""
+        found = {}
+        keys = list(keys)
+        with self._lock:
+            for start in range(0, len(keys), 500):  # Stay below SQLite's variable limit
+                batch = keys[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+        return found
+
+    def put_many(self, model_name, vectors):
+        """Store {key: vector}."""
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(key, model_name, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in vectors.items()],
+            )
+            self._connection.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+# Function to get the process wide cache for a database file
+@functools.lru_cache(maxsize=None)
+def get_embedding_cache(path):
+    return EmbeddingCache(path)
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain embeddings that look every text up in the cache before calling the backend.
+
+    Misses are de-duplicated and sent to backend.embed_documents in batches of batch_size,
+    at most concurrency batches at a time (429 responses are retried with backoff).
+    """
+
+    def __init__(self, backend, model_name, cache, batch_size=100, concurrency=4, limiter=None):
+        self.backend = backend
+        self.model_name = model_name
+        self.cache = cache
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.limiter = limiter
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hits, misses, batches=0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.batches += batches
+
+    def embed_documents(self, texts):
+        keys = [text_key(self.model_name, "document", text) for text in texts]
+        vectors = self.cache.get_many(set(keys))
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        self._count(len(keys) - len(missing), len(missing))  # Repeats within texts count as hits
+
+        if missing:
+            missing_keys = list(missing)
+            batches = [missing_keys[start:start + self.batch_size]
+                       for start in range(0, len(missing_keys), self.batch_size)]
+            results, _ = run_concurrent(
+                batches,
+                lambda batch: self.backend.embed_documents([missing[key] for key in batch]),
+                concurrency=self.concurrency,
+                limiter=self.limiter,
+            )
+            embedded = {}
+            for batch, (result, error) in zip(batches, results):
+                if error is not None:
+                    raise error
+                embedded.update(zip(batch, result))
+            self.cache.put_many(self.model_name, embedded)
+            vectors.update((key, np.asarray(vector, dtype=np.float32)) for key, vector in embedded.items())
+            self._count(0, 0, len(batches))
+
+        return [vectors[key].tolist() for key in keys]
+
+    def embed_query(self, text):
+        key = text_key(self.model_name, "query", text)
+        cached = self.cache.get_many([key])
+        if key in cached:
+            self._count(1, 0)
+            return cached[key].tolist()
+        self._count(0, 1, 1)
+        vector = self.backend.embed_query(text)
+        self.cache.put_many(self.model_name, {key: vector})
+        return list(vector)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "batches": self.batches,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,219 @@
+# Per-call metrics of model and storage calls: wall time, time to first chunk, tokens,
+# characters, bytes, retries and estimated cost. Every call is appended to a JSONL file,
+# the totals are served as Prometheus text and summarized for the Streamlit apps.
+
+import collections
+import contextlib
+import functools
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Estimated USD per million units, only used for the cost columns (check the current price list)
+prices = {
+    "gemini-1.5-flash-001": {"prompt_tokens": 0.075, "output_tokens": 0.30},
+    "gemini-1.5-pro": {"prompt_tokens": 1.25, "output_tokens": 5.00},
+    "text-embedding-004": {"input_chars": 0.025},
+}
+
+metric_prefix = "video_pipeline"
+
+
+def estimate_cost(name, counts):
+    rates = prices.get(name, {})
+    return sum(rate * counts.get(unit, 0) / 1e6 for unit, rate in rates.items())
+
+
+# One measured call, the caller fills in what it learns while the call runs
+class Call:
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.started = time.perf_counter()
+        self.first_chunk = None
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.input_chars = 0
+        self.bytes = 0
+        self.retries = 0
+        self.error = None
+
+    def chunk(self):
+        """Mark the arrival of a streamed chunk, the first one sets the time to first chunk."""
+        if self.first_chunk is None:
+            self.first_chunk = time.perf_counter() - self.started
+
+    def usage(self, usage_metadata):
+        """Take the token counts from Vertex AI usage metadata (the last chunk has the totals)."""
+        if usage_metadata is None:
+            return
+        self.prompt_tokens = max(self.prompt_tokens, getattr(usage_metadata, "prompt_token_count", 0) or 0)
+        self.output_tokens = max(self.output_tokens, getattr(usage_metadata, "candidates_token_count", 0) or 0)
+
+    def stream(self, responses):
+        """Yield the chunks of a stream=True response while recording first chunk and usage."""
+        for response in responses:
+            self.chunk()
+            self.usage(getattr(response, "usage_metadata", None))
+            yield response
+
+
+class MetricsRegistry:
+    """Thread safe totals per (kind, name) plus a window of recent latencies for quantiles."""
+
+    def __init__(self, path=None, window=1000):
+        self.path = path
+        self.window = window
+        self._totals = {}
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def call(self, kind, name):
+        call = Call(kind, name)
+        try:
+            yield call
+        except Exception as e:
+            call.error = type(e).__name__
+            raise
+        finally:
+            self.record(call)
+
+    def record(self, call):
+        seconds = time.perf_counter() - call.started
+        counts = {
+            "prompt_tokens": call.prompt_tokens,
+            "output_tokens": call.output_tokens,
+            "input_chars": call.input_chars,
+        }
+        event = {
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "kind": call.kind,
+            "name": call.name,
+            "seconds": round(seconds, 4),
+            "first_chunk_seconds": None if call.first_chunk is None else round(call.first_chunk, 4),
+            **counts,
+            "bytes": call.bytes,
+            "retries": call.retries,
+            "cost_usd": estimate_cost(call.name, counts),
+            "error": call.error,
+        }
+        key = (call.kind, call.name)
+        with self._lock:
+            totals = self._totals.setdefault(key, collections.Counter())
+            totals["calls"] += 1
+            totals["errors"] += call.error is not None
+            totals["seconds"] += seconds
+            if call.first_chunk is not None:
+                totals["first_chunk_calls"] += 1
+                totals["first_chunk_seconds"] += call.first_chunk
+            for field in ("prompt_tokens", "output_tokens", "input_chars", "bytes", "retries", "cost_usd"):
+                totals[field] += event[field]
+            self._latencies.setdefault(key, collections.deque(maxlen=self.window)).append(seconds)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(event) + "\n")
+
+    def count_retry(self, kind, name):
+        """Count a retry that happens outside of a measured call (e.g. after a 429)."""
+        with self._lock:
+            self._totals.setdefault((kind, name), collections.Counter())["retries"] += 1
+
+    def _quantile(self, key, q):
+        values = sorted(self._latencies.get(key, ()))
+        return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+    def summary(self):
+        """One row per call type for display."""
+        with self._lock:
+            rows = []
+            for (kind, name), totals in sorted(self._totals.items()):
+                rows.append({
+                    "Kind": kind,
+                    "Name": name,
+                    "Calls": totals["calls"],
+                    "Errors": totals["errors"],
+                    "p50 s": round(self._quantile((kind, name), 0.5), 3),
+                    "p95 s": round(self._quantile((kind, name), 0.95), 3),
+                    "First chunk s": round(totals["first_chunk_seconds"] / totals["first_chunk_calls"], 3)
+                    if totals["first_chunk_calls"] else None,
+                    "Prompt tokens": totals["prompt_tokens"],
+                    "Output tokens": totals["output_tokens"],
+                    "Characters": totals["input_chars"],
+                    "MB": round(totals["bytes"] / 1024 ** 2, 2),
+                    "Retries": totals["retries"],
+                    "Cost USD": round(totals["cost_usd"], 6),
+                })
+            return rows
+
+    def prometheus_text(self):
+        """Totals in the Prometheus text exposition format."""
+        counters = [
+            ("calls_total", "calls", "Calls made"),
+            ("call_errors_total", "errors", "Calls that raised"),
+            ("call_seconds_total", "seconds", "Wall time of all calls"),
+            ("first_chunk_seconds_total", "first_chunk_seconds", "Time to first chunk of streamed calls"),
+            ("streamed_calls_total", "first_chunk_calls", "Streamed calls"),
+            ("prompt_tokens_total", "prompt_tokens", "Prompt tokens"),
+            ("output_tokens_total", "output_tokens", "Output tokens"),
+            ("input_characters_total", "input_chars", "Characters sent for embedding"),
+            ("bytes_total", "bytes", "Bytes transferred"),
+            ("retries_total", "retries", "Retried attempts"),
+            ("cost_usd_total", "cost_usd", "Estimated cost in USD"),
+        ]
+        with self._lock:
+            lines = []
+            for metric, field, description in counters:
+                lines.append(f"# HELP {metric_prefix}_{metric} {description}")
+                lines.append(f"# TYPE {metric_prefix}_{metric} counter")
+                for (kind, name), totals in sorted(self._totals.items()):
+                    lines.append(f'{metric_prefix}_{metric}{{kind="{kind}",name="{name}"}} {totals[field]}')
+            lines.append(f"# HELP {metric_prefix}_call_seconds Recent call latency")
+            lines.append(f"# TYPE {metric_prefix}_call_seconds gauge")
+            for kind, name in sorted(self._latencies):
+                for q in (0.5, 0.95):
+                    value = self._quantile((kind, name), q)
+                    lines.append(f'{metric_prefix}_call_seconds{{kind="{kind}",name="{name}",quantile="{q}"}} {value}')
+            return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    """The process wide registry, shared by all modules."""
+    return _registry
+
+
+def configure_metrics(path):
+    """Append every call of this process to the JSONL file at path."""
+    _registry.path = path
+    return _registry
+
+
+# Function to serve /metrics once per process, returns None when the port is taken
+@functools.lru_cache(maxsize=None)
+def serve_metrics(port, host="0.0.0.0"):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = _registry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError:
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
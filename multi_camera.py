@@ -0,0 +1,216 @@
+# Headless recorder for several RTSP cameras on one machine
+#
+# Every camera runs its own capture/encode pipeline in a separate process so decoding
+# scales across cores, finished segments go into one durable upload spool that is
+# uploaded by threads shared by all cameras.
+#
+#   python multi_camera.py --camera entrance=rtsp://... --camera storage=rtsp://...
+#   python multi_camera.py --config cameras.json   # [{"name": "entrance", "source": "rtsp://..."}, ...]
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from storage_backend import get_bucket
+from uploads import UploadQueue
+
+# Google Cloud Storage settings
+bucket_name = "bucket_name"
+analysis_folder = "folder_name"  # Each camera gets its own subfolder below this one
+key_file_path = "proj_1.json"
+os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = key_file_path
+
+frame_width, frame_height = 1280, 720
+
+
+# Function to convert the video to MP4 using ffmpeg (only used by the "xvid" writer mode)
+def convert_to_mp4(input_file, output_file):
+    try:
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-i', input_file, '-vcodec', 'libx264', output_file],
+                       check=True)
+        return output_file
+    except subprocess.CalledProcessError:
+        return None
+
+
+# Runs in a camera process: record segments and hand them to the shared upload spool
+def run_camera(camera, settings, status, stop_event):
+    import cv2
+    from recorder import MotionDetector, RecordingPipeline, RemuxRecorder
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent process coordinates shutdown
+    cv2.setNumThreads(settings["opencv_threads"])  # Keep per-camera CPU predictable
+
+    name = camera["name"]
+    # Producer only, the parent process runs the upload workers on the same spool directory
+    upload_spool = UploadQueue(None, settings["spool_dir"], workers=0, max_spool_bytes=settings["max_spool_bytes"])
+
+    # Move the segment out of the pipeline's temp dir (no copy) and journal it for upload
+    def enqueue_upload(local_file, destination_blob_name):
+        upload_spool.put(local_file, destination_blob_name, content_type='video/mp4')
+        return "queued"
+
+    blob_prefix = f"{settings['analysis_folder']}/{name}"
+    if settings["writer_mode"] == "remux":
+        pipeline = RemuxRecorder(camera["source"], enqueue_upload, blob_prefix,
+                                 segment_seconds=settings["segment_seconds"], upload_workers=1,
+                                 start_index=settings["start_index"])
+    else:
+        motion_detector = MotionDetector(settings["motion_threshold"]) if settings["motion_gating"] else None
+        pipeline = RecordingPipeline(camera["source"], convert_to_mp4, enqueue_upload, blob_prefix,
+                                     segment_seconds=settings["segment_seconds"],
+                                     queue_size=settings["queue_size"], upload_workers=1,
+                                     start_index=settings["start_index"],
+                                     frame_width=frame_width, frame_height=frame_height,
+                                     writer_mode=settings["writer_mode"], motion_detector=motion_detector)
+    pipeline.start()
+
+    while not stop_event.is_set() and pipeline.is_running():
+        pipeline.drain_completed()  # Upload results are tracked by the parent
+        status[name] = dict(pipeline.stats(), current_segment=pipeline.current_segment, pid=os.getpid(),
+                            updated=time.time(), error=pipeline.error)
+        stop_event.wait(1.0)
+
+    pipeline.stop(wait=True)
+    status[name] = dict(pipeline.stats(), current_segment=None, pid=os.getpid(), updated=time.time(),
+                        error=pipeline.error)
+    if pipeline.error:
+        raise RuntimeError(f"{name}: {pipeline.error}")
+    return name
+
+
+# Count finished uploads per camera (the camera is the folder right below analysis_folder)
+def collect_uploads(upload_queue, upload_stats):
+    for done in upload_queue.drain_completed():
+        name = done["blob_name"].split("/")[-2]
+        if name in upload_stats:
+            upload_stats[name]["uploaded"] += 1
+            upload_stats[name]["last_upload"] = done["upload_time"]
+
+
+# Combined status view for all cameras, a camera whose process ended or whose pipeline stopped is marked
+def format_status(cameras, status, upload_stats, upload_queue, failures=None):
+    failures = failures or {}
+    uploads = upload_queue.stats()
+    lines = [f"{datetime.now():%Y-%m-%d %H:%M:%S}  upload spool: {uploads['pending']} pending, "
+             f"{uploads['spool_bytes'] / 1024 ** 2:.1f} MB, {uploads['retries']} retries"]
+    lines.append(f"{'camera':<16}{'pid':>8}{'queue':>10}{'dropped':>9}{'recorded':>10}{'failed':>8}"
+                 f"{'uploaded':>10}  current segment")
+    for camera in cameras:
+        name = camera["name"]
+        stats = status.get(name, {})
+        camera_uploads = upload_stats[name]
+        queue_text = f"{stats.get('queue_depth', '-')}/{stats.get('queue_capacity', '-')}"
+        error = failures.get(name) or stats.get("error")
+        state = f"DEAD: {error}" if error else stats.get('current_segment') or '-'
+        lines.append(f"{name:<16}{stats.get('pid', '-'):>8}{queue_text:>10}{stats.get('frames_dropped', '-'):>9}"
+                     f"{stats.get('segments_recorded', 0):>10}{stats.get('segments_failed', 0):>8}"
+                     f"{camera_uploads['uploaded']:>10}  {state}")
+    return "\n".join(lines)
+
+
+# Errors of camera processes that already ended, reported while the other cameras keep recording
+def collect_failures(cameras, futures, failures, stopping=False):
+    for camera, future in zip(cameras, futures):
+        name = camera["name"]
+        if name in failures or not future.done():
+            continue
+        error = future.exception()
+        if error is None and stopping:
+            continue  # Ended because we asked it to
+        failures[name] = str(error) if error else "camera process ended"
+        print(f"Camera process failed: {failures[name]}", flush=True)
+
+
+def load_cameras(args):
+    cameras = []
+    if args.config:
+        with open(args.config, encoding="utf-8") as file:
+            cameras.extend(json.load(file))
+    for item in args.camera:
+        name, _, source = item.partition("=")
+        cameras.append({"name": name, "source": source})
+    names = [camera["name"] for camera in cameras]
+    if not cameras or len(set(names)) != len(names):
+        raise SystemExit("Provide at least one camera, every camera needs a unique name")
+    return cameras
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record several RTSP cameras and upload the segments to GCS")
+    parser.add_argument("--camera", action="append", default=[], metavar="NAME=SOURCE")
+    parser.add_argument("--config", help="JSON file with a list of {name, source} objects")
+    parser.add_argument("--segment-seconds", type=float, default=30)
+    parser.add_argument("--start-index", type=int, default=1, help="Counter of the first segment, names also carry the start time")
+    parser.add_argument("--writer-mode", choices=["h264", "remux", "xvid"], default="h264")
+    parser.add_argument("--motion-gating", action="store_true")
+    parser.add_argument("--motion-threshold", type=float, default=0.01)
+    parser.add_argument("--queue-size", type=int, default=256, help="Frames buffered per camera")
+    parser.add_argument("--opencv-threads", type=int, default=1, help="OpenCV threads per camera process")
+    parser.add_argument("--upload-workers", type=int, default=4, help="Upload threads shared by all cameras")
+    parser.add_argument("--spool-dir", default=os.path.join(os.getcwd(), "upload_spool"))
+    parser.add_argument("--max-spool-mb", type=int, default=4096, help="Recording waits while the spool is larger")
+    parser.add_argument("--drain-timeout", type=float, default=60,
+                        help="Seconds to keep uploading after stopping, the rest is uploaded on the next start")
+    parser.add_argument("--status-interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    cameras = load_cameras(args)
+    settings = {
+        "analysis_folder": analysis_folder,
+        "segment_seconds": args.segment_seconds,
+        "start_index": args.start_index,
+        "writer_mode": args.writer_mode,
+        "motion_gating": args.motion_gating,
+        "motion_threshold": args.motion_threshold,
+        "queue_size": args.queue_size,
+        "opencv_threads": args.opencv_threads,
+        "spool_dir": args.spool_dir,
+        "max_spool_bytes": args.max_spool_mb * 1024 ** 2,
+    }
+
+    manager = multiprocessing.Manager()
+    status = manager.dict()
+    stop_event = manager.Event()
+
+    # Pending uploads from an earlier run are picked up right away
+    bucket = get_bucket(bucket_name, key_file_path)
+    upload_queue = UploadQueue(bucket, args.spool_dir, workers=args.upload_workers,
+                               max_spool_bytes=settings["max_spool_bytes"]).start()
+    upload_stats = {camera["name"]: {"uploaded": 0, "last_upload": None} for camera in cameras}
+
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    with ProcessPoolExecutor(max_workers=len(cameras)) as pool:
+        futures = [pool.submit(run_camera, camera, settings, status, stop_event) for camera in cameras]
+        failures = {}
+        try:
+            while not stop_event.is_set() and not all(future.done() for future in futures):
+                collect_uploads(upload_queue, upload_stats)
+                collect_failures(cameras, futures, failures)
+                print(format_status(cameras, status, upload_stats, upload_queue, failures), flush=True)
+                stop_event.wait(args.status_interval)
+        except KeyboardInterrupt:
+            pass
+        stop_event.set()
+        for future in futures:
+            future.exception()  # Wait for every camera to flush its last segment
+        collect_failures(cameras, futures, failures, stopping=True)
+
+    # Give the upload workers a chance to empty the spool before exiting
+    deadline = time.time() + args.drain_timeout
+    while upload_queue.pending() and time.time() < deadline:
+        time.sleep(0.5)
+    upload_queue.stop(timeout=10)
+    collect_uploads(upload_queue, upload_stats)
+    print(format_status(cameras, status, upload_stats, upload_queue, failures))
+    manager.shutdown()
+
+
+if __name__ == "__main__":
+    main()
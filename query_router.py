@@ -0,0 +1,192 @@
+# Local answers for structured questions about the analysis records (counts, time windows,
+# keyword and flag lookups), so only open-ended questions need the chat model
+
+import re
+from datetime import date, timedelta
+
+# Flags computed once per record from the analysis text
+flag_patterns = {
+    "people": r"\b(?:person|people|man|men|woman|women|someone|individual|worker|visitor)\b",
+    "carrying": r"\b(?:carr(?:y|ies|ied|ying)|tak(?:e|es|ing|en)|took|remov(?:e|es|ed|ing)|lift(?:s|ed|ing)?|pick(?:s|ed|ing)? up)\b",
+    "fire_extinguisher": r"\bfire[- ]?extinguishers?\b",
+    "cage": r"\b(?:cage|metal gate)\b",
+}
+no_people_pattern = r"\b(?:there (?:is|are) no (?:people|person|one)|no (?:people|person)\b|nobody|no one)"
+
+# Words in a question that select a flag
+flag_words = {
+    "people": r"\b(people|persons?|someone|anyone|somebody|anybody|humans?)\b",
+    "carrying": r"\b(carr(y|ies|ied|ying)|tak(e|es|ing|en)|took|steal(s|ing)?|stole|remov(e|es|ed|ing)|lift(s|ed|ing)?)\b",
+    "fire_extinguisher": r"\b(fire[- ]?)?extinguishers?\b",
+    "cage": r"\b(cage|metal gate|gate|electrical)\b",
+    "suspicious": r"\b(suspicious|flagged|restricted)\b",
+}
+
+# A negation right before a flag word (up to two words in between) selects videos without the flag
+negation_words = r"\b(?:no one|nobody|no|not|without|never|none|\w+n't)\b"
+negation_gap = r"\s+(?:\w+\s+){0,2}"
+
+video_words = r"(videos?|clips?|recordings?|segments?|files?)"
+time_pattern = r"\b([01]?\d|2[0-3])[:.h]([0-5]\d)\b"
+day_pattern = r"\b(\d{4}-\d{2}-\d{2}|today|yesterday)\b"
+list_limit = 20
+
+# Words that carry no content of their own. A question is only answered locally when every other word is a
+# flag, negation, time or video word, anything else ("a red car", "wearing a helmet") goes to the chat model
+filler_words = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "there", "any", "some", "all", "of", "in", "on",
+    "at", "from", "to", "by", "with", "where", "which", "what", "that", "do", "does", "did", "have", "has", "had",
+    "show", "shows", "showing", "showed", "shown", "contain", "contains", "mention", "mentions", "mentioned",
+    "mentioning", "see", "seen", "recorded", "between", "and", "or", "me", "how", "many", "number", "list", "find",
+    "around", "something", "anything", "it", "they", "them", "happened", "going", "went", "total", "can",
+    "you", "please", "appear", "appears", "present", "activity", "i", "this", "these", "those", "here",
+}
+
+
+class RecordIndex:
+    """Analysis records with precomputed flags, answering structured questions with pandas."""
+
+    def __init__(self, records):
+        import pandas as pd  # Loaded with the first index, not when the app starts
+
+        records = records.copy()
+        text = records["analysis"].fillna("").str.lower()
+        for flag, pattern in flag_patterns.items():
+            records[flag] = text.str.contains(pattern, regex=True)
+        records["people"] &= ~text.str.contains(no_people_pattern, regex=True)
+        records["suspicious"] = records["fire_extinguisher"] | records["cage"]
+        created_at = pd.to_datetime(records["created_time"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+        records["created_date"] = created_at.dt.date
+        records["minute_of_day"] = created_at.dt.hour * 60 + created_at.dt.minute
+        self.records = records
+
+    def _filter(self, start=None, end=None, cameras=None):
+        records = self.records
+        if start is not None:
+            records = records[records["created_time"] >= start]
+        if end is not None:
+            records = records[records["created_time"] <= end]
+        if cameras and "camera" in records:
+            records = records[records["camera"].isin(cameras)]
+        return records
+
+    @staticmethod
+    def _time_window(question):
+        """(date or None, first minute, last minute) of a window named in the question, or None."""
+        times = re.findall(time_pattern, question)
+        day = None
+        day_match = re.search(r"\b(\d{4}-\d{2}-\d{2})\b", question)
+        if day_match:
+            day = date.fromisoformat(day_match.group(1))
+        elif re.search(r"\btoday\b", question):
+            day = date.today()
+        elif re.search(r"\byesterday\b", question):
+            day = date.today() - timedelta(days=1)
+        if len(times) >= 2:
+            first, last = (int(hour) * 60 + int(minute) for hour, minute in times[:2])
+            return day, min(first, last), max(first, last)
+        if len(times) == 1 and re.search(r"\b(at|around)\b", question):
+            minute = int(times[0][0]) * 60 + int(times[0][1])
+            return day, minute, minute + 59
+        if day is not None:
+            return day, 0, 24 * 60 - 1
+        return None
+
+    def answer(self, question, start=None, end=None, cameras=None):
+        """Markdown answer, or None if the question needs the chat model."""
+        question = question.lower().strip()
+        if self._uncovered_words(question):
+            return None  # Words the router does not understand would be silently dropped
+        flags = [flag for flag, pattern in flag_words.items() if re.search(pattern, question)]
+        negated = self._negated_flags(question)
+        if negated is None:
+            return None  # A negation we cannot attach to a flag, the chat model reads it correctly
+        if "people" in negated and "people" not in flags:
+            flags.append("people")  # "nobody" / "no one" on its own
+        window = self._time_window(question)
+        counting = re.search(rf"\b(how many|number of)\s+(\w+\s+)?{video_words}\b", question)
+        listing = re.search(rf"\b(list|show|which|find)\b.*\b{video_words}\b|\b{video_words}\b (where|with|that|in which)\b",
+                            question)
+        happened = re.search(r"\bwhat (happened|was going on|went on)\b", question)
+
+        # Counts are always local, listings need something to select by
+        if not counting and not ((listing or happened) and (flags or window)):
+            return None
+
+        records = self._filter(start, end, cameras)
+        total = len(records)
+        if window is not None:
+            day, first, last = window
+            records = records[(records["minute_of_day"] >= first) & (records["minute_of_day"] <= last)]
+            if day is not None:
+                records = records[records["created_date"] == day]
+        for flag in flags:
+            records = records[~records[flag]] if flag in negated else records[records[flag]]
+
+        description = self._describe(flags, window, negated)
+        if counting:
+            return f"{len(records)} of {total} videos {description}."
+        if records.empty:
+            return f"No videos {description}."
+        lines = [f"{len(records)} video{'s' if len(records) != 1 else ''} {description}:"]
+        for row in records.head(list_limit).itertuples(index=False):
+            words = str(row.analysis).split()
+            summary = " ".join(words[:40]) + (" ..." if len(words) > 40 else "")
+            lines.append(f"- **{row.video_title}** ({row.created_time}): {summary}")
+        if len(records) > list_limit:
+            lines.append(f"- ... and {len(records) - list_limit} more")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _uncovered_words(question):
+        """Words of the question that are not flag, negation, time, video or filler words."""
+        for pattern in (*flag_words.values(), negation_words, time_pattern, day_pattern, video_words):
+            question = re.sub(pattern, " ", question)
+        return [word for word in re.findall(r"[a-z0-9']+", question) if word not in filler_words]
+
+    @staticmethod
+    def _negated_flags(question):
+        """Flags negated in the question ("no people", "without anyone", "nobody took"), None if unclear."""
+        negated = set()
+        negated_starts = set()  # (flag, position) of flag words right after a negation
+        for negation in re.finditer(negation_words, question):
+            following = [(flag, match.start()) for flag, pattern in flag_words.items()
+                         for match in re.finditer(pattern, question)
+                         if match.start() >= negation.end()
+                         and re.fullmatch(negation_gap, question[negation.end():match.start()])]
+            if following:
+                flag, start = min(following, key=lambda item: item[1])
+                negated.add(flag)
+                negated_starts.add((flag, start))
+            elif negation.group() in ("nobody", "no one"):
+                negated.add("people")
+            else:
+                return None
+        # Asserted and negated in one question ("someone took something and no one noticed")
+        for flag in negated:
+            if any((flag, match.start()) not in negated_starts for match in re.finditer(flag_words[flag], question)):
+                return None
+        return negated
+
+    @staticmethod
+    def _describe(flags, window, negated=()):
+        names = {
+            "people": "with people",
+            "carrying": "where something is taken or carried",
+            "fire_extinguisher": "mentioning a fire extinguisher",
+            "cage": "mentioning the cage",
+            "suspicious": "with suspicious activity (cage or fire extinguisher)",
+        }
+        negated_names = {
+            "people": "without people",
+            "carrying": "where nothing is taken or carried",
+            "fire_extinguisher": "not mentioning a fire extinguisher",
+            "cage": "not mentioning the cage",
+            "suspicious": "without suspicious activity (cage or fire extinguisher)",
+        }
+        parts = [negated_names[flag] if flag in negated else names[flag] for flag in flags]
+        if window is not None:
+            day, first, last = window
+            span = f"between {first // 60:02d}:{first % 60:02d} and {last // 60:02d}:{last % 60:02d}"
+            parts.append(f"recorded {span}" + (f" on {day}" if day else ""))
+        return " and ".join(parts) if parts else "in total"
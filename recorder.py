@@ -0,0 +1,538 @@
+# Pipelined RTSP recording: capture, segment writing and encode/upload run concurrently
+
+import collections
+import csv
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+
+# Legacy writer: XVID AVI that still has to be transcoded to MP4 before upload
+class XvidSegmentWriter:
+    extension = ".avi"
+    needs_encode = True
+
+    def __init__(self, path, fps, size):
+        self.path = path
+        # Using XVID codec for AVI format
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'XVID'), fps, size)
+
+    def write(self, frame):
+        self._writer.write(frame)
+
+    def close(self):
+        self._writer.release()  # Ensure the video is finalized and written correctly
+        return self.path
+
+
+# Single-pass writer: raw BGR frames are piped into one libx264 encode
+class H264SegmentWriter:
+    """Write an upload-ready, faststart MP4 without an intermediate file."""
+
+    extension = ".mp4"
+    needs_encode = False
+
+    def __init__(self, path, fps, size, preset="veryfast", crf=23):
+        self.path = path
+        width, height = size
+        command = [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', f'{fps:.3f}', '-i', '-',
+            '-an', '-c:v', 'libx264', '-preset', preset, '-crf', str(crf), '-pix_fmt', 'yuv420p',
+            '-movflags', '+faststart', path,
+        ]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        # Frames from cap.read() are contiguous, so the buffer is handed over without a copy
+        self._process.stdin.write(frame.data)
+
+    def close(self):
+        self._process.stdin.close()
+        error = self._process.stderr.read().decode(errors="replace")
+        if self._process.wait() != 0:
+            raise RuntimeError(f"Error encoding video to MP4: {error.strip()}")
+        return self.path
+
+
+segment_writers = {
+    "xvid": XvidSegmentWriter,
+    "h264": H264SegmentWriter,
+}
+
+
+# Function to name a segment after its start time, so names sort in recording order and a
+# restarted recorder (new session, new process) never overwrites earlier segments
+def segment_name(timestamp, index):
+    return f"video_{datetime.fromtimestamp(timestamp):%Y%m%d_%H%M%S}_{index:04d}.mp4"
+
+
+# Frame differencing on a downscaled grayscale copy of each frame
+class MotionDetector:
+    """Score the share of pixels that changed since the previous frame."""
+
+    def __init__(self, threshold=0.01, pixel_threshold=25, width=160):
+        self.threshold = threshold  # Share of changed pixels that counts as motion
+        self.pixel_threshold = pixel_threshold  # Grey level difference that counts as a changed pixel
+        self.width = width
+        self._previous = None
+
+    def score(self, frame):
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, height * self.width // width)), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        previous, self._previous = self._previous, gray
+        if previous is None or previous.shape != gray.shape:
+            return 0.0
+        changed = cv2.absdiff(gray, previous) > self.pixel_threshold
+        return float(np.count_nonzero(changed)) / changed.size
+
+    def is_motion(self, score):
+        return score >= self.threshold
+
+
+# Thread that keeps the camera open and feeds a bounded frame queue
+class CaptureThread(threading.Thread):
+    """Read frames from a camera without ever releasing it between segments."""
+
+    def __init__(self, source, frame_queue, frame_width=1280, frame_height=720, reconnect_delay=2.0):
+        super().__init__(daemon=True)
+        self.source = source
+        self.frame_queue = frame_queue
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.reconnect_delay = reconnect_delay
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.read_failures = 0
+        self.latest_frame = None  # Most recent frame, for previews
+        self._timestamps = collections.deque(maxlen=100)  # Recent frame times, for the measured fps
+        self._stop_event = threading.Event()
+
+    def open(self):
+        """Open the camera and apply the requested resolution."""
+        cap = cv2.VideoCapture(self.source)
+        if cap.isOpened():
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.frame_width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.frame_height)
+        return cap
+
+    def run(self):
+        cap = self.open()
+        while not self._stop_event.is_set():
+            ret, frame = cap.read() if cap.isOpened() else (False, None)
+            if not ret:
+                # Reconnect instead of giving up, the stream often hiccups for a moment
+                self.read_failures += 1
+                cap.release()
+                self._stop_event.wait(self.reconnect_delay)
+                cap = self.open()
+                continue
+
+            timestamp = time.time()
+            self.frames_captured += 1
+            self.latest_frame = frame
+            self._timestamps.append(timestamp)
+            try:
+                self.frame_queue.put_nowait((timestamp, frame))
+            except queue.Full:
+                # The writer fell behind, drop the frame rather than stall the camera
+                self.frames_dropped += 1
+        cap.release()
+
+    def measured_fps(self):
+        """Frame rate the camera actually delivers, None until a few frames arrived."""
+        timestamps = list(self._timestamps)
+        if len(timestamps) < 10 or timestamps[-1] <= timestamps[0]:
+            return None
+        return (len(timestamps) - 1) / (timestamps[-1] - timestamps[0])
+
+    def stop(self):
+        self._stop_event.set()
+
+
+# Downscaled JPEG of a frame, small enough to push to the browser a few times per second
+def encode_preview(frame, width=640, quality=70):
+    height = frame.shape[0] * width // frame.shape[1]
+    small = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ok else None
+
+
+# Shared worker pool: finalize, encode if needed, upload and clean up finished segments
+class SegmentUploadPool:
+    """Base class for recorders that hand finished segments to background workers.
+
+    encode_fn(raw_path, mp4_path) must return the encoded path or None on failure,
+    upload_fn(local_file, blob_name) must return the upload time.
+    """
+
+    def __init__(self, encode_fn, upload_fn, blob_prefix, upload_workers=2, start_index=1):
+        self.encode_fn = encode_fn
+        self.upload_fn = upload_fn
+        self.blob_prefix = blob_prefix
+        self.next_index = start_index
+        self.work_dir = tempfile.mkdtemp(prefix="recorder_")
+        self.executor = ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix="segment-upload")
+        # At most one segment waiting per busy worker: when uploads (or a full upload spool) fall behind,
+        # the writer waits in _submit and the frame queue drops frames, instead of finished segments and
+        # open encoders piling up in work_dir
+        self._slots = threading.BoundedSemaphore(upload_workers * 2)
+
+        # Finished segments (uploaded or failed) for the UI thread to pick up
+        self.completed = queue.Queue()
+        self.current_segment = None
+        self.segments_recorded = 0
+        self.segments_uploaded = 0
+        self.segments_failed = 0
+        self.error = None  # Why recording stopped on its own, for the UI
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """Counters for the status view."""
+        with self._lock:
+            pending = self._pending
+        return {
+            "segments_recorded": self.segments_recorded,
+            "segments_pending": pending,
+            "segments_uploaded": self.segments_uploaded,
+            "segments_failed": self.segments_failed,
+        }
+
+    def drain_completed(self):
+        """Return every segment finished since the last call."""
+        finished = []
+        while True:
+            try:
+                finished.append(self.completed.get_nowait())
+            except queue.Empty:
+                return finished
+
+    def _submit(self, segment):
+        self._slots.acquire()  # Released when the worker is done with the segment
+        self.segments_recorded += 1
+        with self._lock:
+            self._pending += 1
+        self.executor.submit(self._encode_and_upload, segment)
+
+    def _fail(self, segment, message):
+        """Report a segment that could not be finished as failed and remove its file."""
+        try:
+            if "writer" in segment:
+                segment["writer"].close()
+        except Exception:
+            pass  # The encoder is what failed
+        if os.path.exists(segment["path"]):
+            os.unlink(segment["path"])
+        self.segments_recorded += 1
+        with self._lock:
+            self.segments_failed += 1
+        self.completed.put({
+            "Video Title": segment["video_filename"],
+            "Recording Time": segment["recording_time"],
+            "Frames": segment.get("frames"),
+            "FPS": segment.get("fps"),
+            "Motion Score": segment.get("motion_score"),
+            "Error": message,
+        })
+
+    def _encode_and_upload(self, segment):
+        mp4_path = os.path.join(self.work_dir, segment["video_filename"])
+        result = {
+            "Video Title": segment["video_filename"],
+            "Recording Time": segment["recording_time"],
+            "Frames": segment.get("frames"),
+            "FPS": segment.get("fps"),
+            "Motion Score": segment.get("motion_score"),
+        }
+        try:
+            if "writer" in segment:
+                segment["writer"].close()
+
+            upload_file = segment["path"]
+            if segment["needs_encode"]:
+                if os.path.exists(mp4_path):
+                    os.unlink(mp4_path)  # ffmpeg would otherwise prompt before overwriting
+                upload_file = self.encode_fn(segment["path"], mp4_path)
+                if not upload_file:
+                    raise RuntimeError("Video conversion failed. The video was not uploaded.")
+
+            upload_time = self.upload_fn(upload_file, f"{self.blob_prefix}/{segment['video_filename']}")
+            result["Upload Time"] = upload_time
+        except Exception as e:
+            result["Error"] = str(e)
+        finally:
+            for path in {segment["path"], mp4_path}:
+                if os.path.exists(path):
+                    os.unlink(path)
+            with self._lock:
+                self._pending -= 1
+                if "Error" in result:
+                    self.segments_failed += 1
+                else:
+                    self.segments_uploaded += 1
+            self._slots.release()
+        self.completed.put(result)
+
+
+# Capture thread -> segment writer thread -> encode/upload worker pool
+class RecordingPipeline(SegmentUploadPool):
+    """Gapless segmented recording from decoded frames.
+
+    Segments are written at the frame rate measured on the camera, fps is only used
+    until enough frames arrived to measure it.
+
+    writer_mode "h264" pipes frames straight into libx264 and uploads the result as is,
+    "xvid" keeps the legacy AVI writer followed by encode_fn.
+
+    With a motion_detector, segments are only recorded while there is motion: a segment
+    starts with the last pre_roll seconds of footage and ends post_roll seconds after the
+    last motion (or after segment_seconds, in which case the next one starts immediately).
+    """
+
+    def __init__(self, source, encode_fn, upload_fn, blob_prefix, segment_seconds=30, fps=20.0,
+                 queue_size=256, upload_workers=2, start_index=1, frame_width=1280, frame_height=720,
+                 writer_mode="h264", motion_detector=None, pre_roll=2.0, post_roll=5.0):
+        super().__init__(encode_fn, upload_fn, blob_prefix, upload_workers, start_index)
+        self.segment_seconds = segment_seconds
+        self.fps = fps
+        self.writer_class = segment_writers[writer_mode]
+        self.motion_detector = motion_detector
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.motion_score = None  # Score of the latest frame, for the status view
+
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.capture = CaptureThread(source, self.frame_queue, frame_width, frame_height)
+        self.writer_thread = threading.Thread(target=self._write_segments, daemon=True)
+        self.frames_written = 0
+        self._stop_event = threading.Event()
+
+    def start(self):
+        self.capture.start()
+        self.writer_thread.start()
+        return self
+
+    def stop(self, wait=True):
+        """Stop capturing, flush the open segment and optionally wait for uploads."""
+        self.capture.stop()
+        self.capture.join()
+        self._stop_event.set()
+        self.writer_thread.join()
+        self.executor.shutdown(wait=wait)
+        if wait:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    @property
+    def latest_frame(self):
+        return self.capture.latest_frame
+
+    def is_running(self):
+        return self.writer_thread.is_alive()
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({
+            "queue_depth": self.frame_queue.qsize(),
+            "queue_capacity": self.frame_queue.maxsize,
+            "frames_captured": self.capture.frames_captured,
+            "frames_dropped": self.capture.frames_dropped,
+            "read_failures": self.capture.read_failures,
+            "frames_written": self.frames_written,
+            "capture_fps": self.capture.measured_fps(),
+            "motion_score": self.motion_score,
+        })
+        return stats
+
+    # Writer thread: cut the frame stream into fixed length segments
+    def _write_segments(self):
+        segment = None
+        pre_roll = collections.deque()
+        last_motion = None
+        try:
+            while True:
+                try:
+                    timestamp, frame = self.frame_queue.get(timeout=0.5)
+                except queue.Empty:
+                    if self._stop_event.is_set():
+                        break
+                    continue
+
+                score = None
+                if self.motion_detector is not None:
+                    score = self.motion_score = self.motion_detector.score(frame)
+                    if self.motion_detector.is_motion(score):
+                        last_motion = timestamp
+                    if last_motion is None or timestamp - last_motion >= self.post_roll:
+                        # Idle: close the running segment and only keep the pre-roll buffer
+                        if segment is not None:
+                            self._submit(segment)
+                            segment = None
+                        pre_roll.append((timestamp, frame, score))
+                        while timestamp - pre_roll[0][0] > self.pre_roll:
+                            pre_roll.popleft()
+                        continue
+
+                if segment is None:
+                    pre_roll.append((timestamp, frame, score))
+                    segment = self._open_segment(pre_roll[0][0], frame)
+                    while pre_roll:
+                        self._write_frame(segment, *pre_roll.popleft())
+                else:
+                    self._write_frame(segment, timestamp, frame, score)
+
+                if timestamp - segment["start"] >= self.segment_seconds:
+                    # Finalizing happens in the worker pool so the next segment starts right away
+                    self._submit(segment)
+                    segment = None
+
+            if segment is not None:
+                self._submit(segment)
+        except Exception as e:
+            # ffmpeg missing or gone (FileNotFoundError, BrokenPipeError): stop instead of
+            # dropping every frame from here on, the UI shows self.error
+            self.error = f"Recording stopped: {e}"
+            self.capture.stop()
+            if segment is not None:
+                self._fail(segment, self.error)
+
+    def _write_frame(self, segment, timestamp, frame, score):
+        segment["writer"].write(frame)
+        segment["frames"] += 1
+        self.frames_written += 1
+        if timestamp > segment["start"]:
+            # Real frame rate of this segment, reported with the upload
+            segment["fps"] = round((segment["frames"] - 1) / (timestamp - segment["start"]), 2)
+        if score is not None:
+            segment["motion_score"] = max(segment.get("motion_score") or 0.0, round(score, 4))
+
+    def _open_segment(self, timestamp, frame):
+        index = self.next_index
+        self.next_index += 1
+        path = os.path.join(self.work_dir, f"video_{index}{self.writer_class.extension}")
+        height, width = frame.shape[:2]
+        fps = self.capture.measured_fps() or self.fps
+
+        segment = {
+            "index": index,
+            "path": path,
+            "video_filename": segment_name(timestamp, index),
+            "start": timestamp,
+            "recording_time": datetime.fromtimestamp(timestamp).strftime("%H:%M"),
+            "frames": 0,
+            "fps": round(fps, 2),
+            "writer": self.writer_class(path, fps, (width, height)),
+            "needs_encode": self.writer_class.needs_encode,
+        }
+        self.current_segment = segment["video_filename"]
+        return segment
+
+
+# Stream copy recorder: ffmpeg remuxes the camera's H.264 into MP4 segments, nothing is decoded
+class RemuxRecorder(SegmentUploadPool):
+    """Gapless segmented recording without decoding, for cameras that already send H.264.
+
+    There is no preview in this mode because frames never reach Python.
+    """
+
+    def __init__(self, source, upload_fn, blob_prefix, segment_seconds=30, upload_workers=2, start_index=1):
+        super().__init__(None, upload_fn, blob_prefix, upload_workers, start_index)
+        self.source = source
+        self.segment_seconds = segment_seconds
+        self.latest_frame = None
+        self.segment_list = os.path.join(self.work_dir, "segments.csv")
+        self._process = None
+        self._segment_started = None
+        self._watcher = threading.Thread(target=self._watch_segments, daemon=True)
+        self._stop_event = threading.Event()
+        self._stopping = False  # ffmpeg exits we asked for are not errors
+
+    def start(self):
+        input_options = ['-rtsp_transport', 'tcp'] if str(self.source).startswith('rtsp') else []
+        command = [
+            'ffmpeg', '-y', '-loglevel', 'error', *input_options, '-i', str(self.source),
+            '-map', '0:v:0', '-c', 'copy',
+            '-f', 'segment', '-segment_time', str(self.segment_seconds), '-reset_timestamps', '1',
+            '-segment_format', 'mp4', '-segment_format_options', 'movflags=+faststart',
+            '-segment_start_number', str(self.next_index),
+            '-segment_list', self.segment_list, '-segment_list_type', 'csv',
+            os.path.join(self.work_dir, 'video_%d.mp4'),
+        ]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self._segment_started = time.time()
+        self.current_segment = segment_name(self._segment_started, self.next_index)
+        self._watcher.start()
+        return self
+
+    def stop(self, wait=True):
+        """Ask ffmpeg to close the open segment, then upload whatever is left."""
+        self._stopping = True
+        if self._process.poll() is None:
+            try:
+                self._process.communicate(b"q", timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.terminate()
+                self._process.wait()
+        self._stop_event.set()
+        self._watcher.join()
+        self.executor.shutdown(wait=wait)
+        if wait:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def is_running(self):
+        if self._process is None:
+            return False
+        if self._process.poll() is None:
+            return True
+        self._check_exit()  # Callers read self.error right after this returned False
+        return False
+
+    def _check_exit(self):
+        """Record why ffmpeg ended if nobody asked it to, even with exit code 0 (the stream ended)."""
+        code = self._process.poll()
+        if code is None or self._stopping or self.error is not None:
+            return
+        if code:
+            self.error = f"Recording stopped: ffmpeg exited with code {code}"
+        else:
+            self.error = "Recording stopped: the camera stream ended"
+
+    # ffmpeg only appends a segment to the list once that segment is closed
+    def _watch_segments(self):
+        seen = 0
+        while True:
+            finished = self._stop_event.is_set()
+            if os.path.exists(self.segment_list):
+                with open(self.segment_list, newline="") as file:
+                    rows = [row for row in csv.reader(file) if row]
+                for row in rows[seen:]:
+                    self._submit_file(row[0])
+                seen = len(rows)
+            if finished:
+                break
+            self._check_exit()
+            self._stop_event.wait(0.5)
+
+    def _submit_file(self, filename):
+        index = int(os.path.splitext(filename)[0].split("_")[-1])
+        started = self._segment_started
+        self._segment_started = time.time()
+        self.next_index = index + 1
+        self.current_segment = segment_name(self._segment_started, self.next_index)
+        self._submit({
+            "index": index,
+            "path": os.path.join(self.work_dir, filename),
+            "video_filename": segment_name(started, index),
+            "recording_time": datetime.fromtimestamp(started).strftime("%H:%M"),
+            "needs_encode": False,
+        })
@@ -0,0 +1,129 @@
+# Incremental PDF report: rows are rendered into fixed-size part files that are only
+# re-rendered when their rows change, the full report is assembled by copying pages
+
+import hashlib
+import json
+import os
+
+from PyPDF2 import PdfReader, PdfWriter
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle
+
+report_columns = ["Video Title", "Upload Time", "Created Time", "Analysis"]
+column_widths = [1.2*inch, 1.2*inch, 1.2*inch, 5.1*inch]  # Adjust colWidths for Analysis column
+
+table_style = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Align text to the top
+])
+
+# Use a smaller font size for the table
+small_style = ParagraphStyle("ReportCell", parent=getSampleStyleSheet()['Normal'], fontSize=8)
+
+
+# Function to render rows into one PDF as a sequence of small tables
+def render_rows(rows, pdf_path, table_rows=40):
+    """rows is a list of value lists in report_columns order.
+
+    Small tables keep reportlab's layout cost linear, one huge Table has to be split
+    page by page which gets slow and memory hungry with thousands of rows.
+    """
+    doc = SimpleDocTemplate(pdf_path, pagesize=letter)
+    elements = []
+    for start in range(0, len(rows), table_rows):
+        data = [report_columns]  # Header row
+        for row in rows[start:start + table_rows]:
+            # Create paragraphs for each cell to handle text wrapping and size
+            data.append([Paragraph(str(value), small_style) for value in row])
+        table = Table(data, colWidths=column_widths, repeatRows=1)
+        table.setStyle(table_style)
+        elements.append(table)
+    if not elements:
+        elements.append(Table([report_columns], colWidths=column_widths, style=table_style))
+    doc.build(elements)
+
+
+def row_digest(rows):
+    return hashlib.sha1(json.dumps(rows, default=str).encode("utf-8")).hexdigest()
+
+
+# Report split into part files, tracked in a manifest next to them
+class ReportBuilder:
+    """Render a report as parts of at most rows_per_part rows.
+
+    With split_by_day the rows of each created date go into their own parts, so older
+    days never need to be rendered again. Parts whose rows did not change are reused.
+    """
+
+    def __init__(self, parts_dir, rows_per_part=500, split_by_day=True, table_rows=40):
+        self.parts_dir = parts_dir
+        self.rows_per_part = rows_per_part
+        self.split_by_day = split_by_day
+        self.table_rows = table_rows
+        self.manifest_path = os.path.join(parts_dir, "manifest.json")
+        os.makedirs(parts_dir, exist_ok=True)
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def _save_manifest(self, manifest):
+        with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(manifest, file, indent=1)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+    def _partition(self, video_log):
+        """Ordered {part key: rows} for the report rows."""
+        parts = {}
+        day_counts = {}
+        for row in video_log[report_columns].astype(str).values.tolist():
+            created = row[2]
+            day = created[:10] if self.split_by_day and created[:4].isdigit() else "all"
+            index = day_counts.get(day, 0)
+            day_counts[day] = index + 1
+            parts.setdefault(f"{day}_{index // self.rows_per_part:05d}", []).append(row)
+        return parts
+
+    def build(self, video_log):
+        """Render new or changed parts, return (part paths in order, number of parts rendered)."""
+        manifest = self._load_manifest()
+        parts = self._partition(video_log)
+        rendered = 0
+        for key, rows in parts.items():
+            digest = row_digest(rows)
+            path = os.path.join(self.parts_dir, f"part_{key}.pdf")
+            if manifest.get(key, {}).get("digest") == digest and os.path.exists(path):
+                continue
+            render_rows(rows, path, self.table_rows)
+            manifest[key] = {"digest": digest, "rows": len(rows), "file": os.path.basename(path)}
+            rendered += 1
+
+        # Drop parts that no longer have rows
+        for key in set(manifest) - set(parts):
+            stale = os.path.join(self.parts_dir, manifest.pop(key)["file"])
+            if os.path.exists(stale):
+                os.unlink(stale)
+        self._save_manifest(manifest)
+        return [os.path.join(self.parts_dir, manifest[key]["file"]) for key in sorted(parts)], rendered
+
+    def assemble(self, part_paths, pdf_path):
+        """Combine the part files into one PDF by copying their pages, nothing is re-rendered."""
+        writer = PdfWriter()
+        for path in part_paths:
+            for page in PdfReader(path).pages:
+                writer.add_page(page)
+        with open(pdf_path, "wb") as file:
+            writer.write(file)
+        return pdf_path
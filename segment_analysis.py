@@ -0,0 +1,91 @@
+# Long videos analyzed as time-aligned parts: ffmpeg splits them without re-encoding, the
+# parts are analyzed concurrently and their events merged into one timeline
+
+import csv
+import os
+import re
+import subprocess
+
+import cv2
+
+
+def video_duration(path):
+    """Duration of a video file in seconds, from its frame count and frame rate."""
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0
+    finally:
+        cap.release()
+    return frames / fps if fps > 0 else 0.0
+
+
+# Function to read a video's duration from its container header with ffmpeg
+def probe_duration(source):
+    """Duration in seconds of a file or an http(s) URL, None if ffmpeg cannot read it.
+
+    For a URL ffmpeg only fetches the header and index with range requests, not the video.
+    """
+    try:
+        completed = subprocess.run(['ffmpeg', '-hide_banner', '-i', source], stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE, text=True, timeout=60)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", completed.stderr)  # ffmpeg exits 1 without an output
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+# Function to split a video into parts of about segment_seconds with ffmpeg stream copy
+def split_video(input_path, output_dir, segment_seconds=60):
+    """Return [(part path, start seconds, end seconds)] in order.
+
+    Nothing is re-encoded, so cuts happen at the keyframe at or after each boundary and
+    the start / end times come from ffmpeg's segment list, not from the nominal boundaries.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    list_path = os.path.join(output_dir, "parts.csv")
+    command = [
+        'ffmpeg', '-y', '-loglevel', 'error', '-i', input_path,
+        '-map', '0:v', '-c', 'copy',
+        '-f', 'segment', '-segment_time', str(segment_seconds), '-reset_timestamps', '1',
+        '-segment_list', list_path, '-segment_list_type', 'csv',
+        os.path.join(output_dir, 'part_%03d.mp4'),
+    ]
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not split {input_path}: {result.stderr.decode(errors='replace')}")
+
+    parts = []
+    with open(list_path, newline="") as file:
+        for row in csv.reader(file):
+            if len(row) >= 3:
+                parts.append((os.path.join(output_dir, row[0]), float(row[1]), float(row[2])))
+    return parts
+
+
+def format_timestamp(seconds):
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+# Function to shift the mm:ss / h:mm:ss timestamps of a part's analysis to video time
+def offset_timestamps(text, offset):
+    def replace(match):
+        hours = int(match.group(1) or 0)
+        seconds = hours * 3600 + int(match.group(2)) * 60 + int(match.group(3))
+        return format_timestamp(seconds + offset)
+
+    return re.sub(r"\b(?:(\d{1,2}):)?(\d{1,2}):([0-5]\d)\b", replace, text)
+
+
+def merge_timeline(part_results):
+    """One timeline from [(start, end, analysis text)], every part under its time range."""
+    blocks = []
+    for start, end, text in sorted(part_results):
+        blocks.append(f"[{format_timestamp(start)} - {format_timestamp(end)}]\n{offset_timestamps(text.strip(), start)}")
+    return "\n\n".join(blocks)
@@ -0,0 +1,192 @@
+# Storage backends shared by the three scripts. The interface is the part of the
+# google.cloud.storage Bucket / Blob API the pipeline uses:
+#
+#   bucket.blob(name) / bucket.get_blob(name) / bucket.list_blobs(prefix, start_offset)
+#   blob.upload_from_filename / upload_from_string
+#   blob.download_to_filename / download_as_bytes(start, end) / download_as_text
+#   blob.name, generation, md5_hash, size, time_created
+#
+# STORAGE_BACKEND=gcs (default) uses Google Cloud Storage through one shared client,
+# STORAGE_BACKEND=local keeps every bucket as a directory below LOCAL_STORAGE_ROOT, for
+# edge boxes and offline runs.
+
+import functools
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+
+default_local_root = "local_storage"
+
+_storage_client = None
+_client_lock = threading.Lock()
+
+
+# Function to get the process wide storage client (created once, with a larger connection pool)
+def get_storage_client(key_file_path=None, pool_size=16):
+    global _storage_client
+    with _client_lock:
+        if _storage_client is None:
+            import requests
+            from google.cloud import storage
+
+            if key_file_path and os.path.exists(key_file_path):
+                client = storage.Client.from_service_account_json(key_file_path)
+            else:
+                client = storage.Client()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            client._http.mount("https://", adapter)
+            _storage_client = client
+        return _storage_client
+
+
+def link_or_copy(source, destination):
+    """Hardlink source to destination (zero copy), copy if they are on different filesystems."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+# Filesystem-backed bucket with the GCS API, objects are plain files below root
+class LocalBucket:
+    blob_class = None  # LocalBlob, set below
+
+    def __init__(self, root):
+        self.root = root
+        self.name = os.path.basename(os.path.abspath(root))
+        os.makedirs(root, exist_ok=True)
+
+    def blob(self, blob_name, chunk_size=None, generation=None):
+        return self.blob_class(self, blob_name)
+
+    def get_blob(self, blob_name):
+        blob = self.blob_class(self, blob_name)
+        return blob if blob.reload() else None
+
+    def list_blobs(self, prefix=None, start_offset=None, page_size=None):
+        """Blobs in lexicographic name order like GCS, start_offset is inclusive."""
+        # Only the directory of the prefix is walked, not the whole bucket
+        folder = prefix.rsplit("/", 1)[0] if prefix and "/" in prefix else ""
+        names = []
+        for directory, _, files in os.walk(os.path.join(self.root, *folder.split("/"))):
+            for file in files:
+                if file.endswith(".part"):
+                    continue  # Upload in progress
+                name = os.path.relpath(os.path.join(directory, file), self.root).replace(os.sep, "/")
+                if (prefix is None or name.startswith(prefix)) and (start_offset is None or name >= start_offset):
+                    names.append(name)
+        for name in sorted(names):
+            blob = self.blob_class(self, name)
+            if blob.reload():
+                yield blob
+
+
+class LocalBlob:
+    """Object of a LocalBucket. Uploads and downloads hardlink the file, nothing is copied.
+
+    An upload replaces the object atomically with os.replace, so readers that hold an
+    earlier download keep the old content. Writers must not modify a file in place after
+    uploading it (the pipeline always writes new files).
+    """
+
+    _lock = threading.Lock()
+    _counter = 0
+
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.path = os.path.join(bucket.root, *name.split("/"))
+        self.content_type = None
+        self.generation = None
+        self.size = None
+        self.time_created = None
+        self.updated = None
+        self.md5_hash = None  # Not computed, the generation changes with every upload
+
+    def reload(self):
+        """Load generation, size and times from the file, False if the object does not exist."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        self.generation = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.time_created = self.updated = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+        return True
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _temp_path(self):
+        with LocalBlob._lock:
+            LocalBlob._counter += 1
+            return f"{self.path}.{os.getpid()}.{LocalBlob._counter}.part"
+
+    def _publish(self, temp_path):
+        os.utime(temp_path)  # The upload time is the generation
+        os.replace(temp_path, self.path)
+        self.reload()
+
+    def upload_from_filename(self, filename, content_type=None):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self._temp_path()
+        link_or_copy(filename, temp_path)
+        self._publish(temp_path)
+        self.content_type = content_type
+
+    def upload_from_string(self, data, content_type=None):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self._temp_path()
+        with open(temp_path, "wb") as file:
+            file.write(data.encode("utf-8") if isinstance(data, str) else data)
+        self._publish(temp_path)
+        self.content_type = content_type
+
+    def download_to_filename(self, filename):
+        if os.path.exists(filename):
+            os.unlink(filename)
+        link_or_copy(self.path, filename)
+
+    def download_as_bytes(self, start=None, end=None):
+        """Content of the object, start and end are inclusive byte offsets like in GCS."""
+        with open(self.path, "rb") as file:
+            file.seek(start or 0)
+            if end is None:
+                return file.read()
+            return file.read(end - (start or 0) + 1)
+
+    def download_as_text(self, encoding="utf-8"):
+        return self.download_as_bytes().decode(encoding)
+
+    def delete(self):
+        os.unlink(self.path)
+        # Folders only exist through their objects, like in GCS
+        directory = os.path.dirname(self.path)
+        while os.path.abspath(directory) != os.path.abspath(self.bucket.root):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break  # Not empty, or an upload just created it again
+            directory = os.path.dirname(directory)
+
+
+LocalBucket.blob_class = LocalBlob
+
+
+def backend_name():
+    return os.environ.get("STORAGE_BACKEND", "gcs")
+
+
+def is_local(bucket):
+    return isinstance(bucket, LocalBucket)
+
+
+# Function to get the process wide bucket of the configured backend
+@functools.lru_cache(maxsize=None)
+def get_bucket(bucket_name, key_file_path=None):
+    if backend_name() == "local":
+        root = os.environ.get("LOCAL_STORAGE_ROOT", default_local_root)
+        return LocalBucket(os.path.join(root, bucket_name))
+
+    return get_storage_client(key_file_path).bucket(bucket_name)
@@ -0,0 +1,62 @@
+# Incremental listing of BlobCatalog against the local storage backend
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blob_catalog import BlobCatalog  # noqa: E402
+from storage_backend import LocalBucket  # noqa: E402
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    return LocalBucket(str(tmp_path / "bucket"))
+
+
+def upload(bucket, *names):
+    for name in names:
+        bucket.blob(name).upload_from_string(b"x")
+
+
+def test_new_segments_are_found_incrementally(bucket):
+    upload(bucket, "f/video_20241018_100000_0001.mp4", "f/cam_a/video_20241018_100000_0001.mp4")
+    catalog = BlobCatalog(bucket, "f/", ttl=0)
+    assert catalog.refresh(force=True) == 2
+
+    upload(bucket, "f/video_20241018_100030_0002.mp4", "f/cam_a/video_20241018_100030_0002.mp4")
+    assert catalog.refresh() == 2
+    assert "f/cam_a/video_20241018_100030_0002.mp4" in catalog.blobs
+
+
+def test_non_video_names_after_the_segments_do_not_hide_new_segments(bucket):
+    # The reports sort after every video_YYYYMMDD_... name
+    upload(bucket, "f/video_20241018_100000_0001.mp4", "f/video_analysis2.pdf", "f/video_9.mp4",
+           "f/records/analyses.parquet")
+    catalog = BlobCatalog(bucket, "f/", ttl=0)
+    catalog.refresh(force=True)
+
+    upload(bucket, "f/video_20241018_100030_0002.mp4")
+    assert catalog.refresh() == 1
+    assert "f/video_20241018_100030_0002.mp4" in catalog.blobs
+
+
+def test_first_segment_of_the_base_folder_is_found_incrementally(bucket):
+    upload(bucket, "f/video_analysis2.pdf")
+    catalog = BlobCatalog(bucket, "f/", ttl=0)
+    catalog.refresh(force=True)
+
+    upload(bucket, "f/video_20241018_100000_0001.mp4")
+    assert catalog.refresh() == 1
+
+
+def test_full_refresh_forgets_deleted_blobs(bucket):
+    upload(bucket, "f/video_20241018_100000_0001.mp4", "f/video_20241018_100030_0002.mp4")
+    catalog = BlobCatalog(bucket, "f/", ttl=0)
+    catalog.refresh(force=True)
+
+    bucket.blob("f/video_20241018_100000_0001.mp4").delete()
+    catalog.refresh(force=True)
+    assert list(catalog.blobs) == ["f/video_20241018_100030_0002.mp4"]
@@ -0,0 +1,31 @@
+# Process wide singletons of core.py
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import cache_once  # noqa: E402
+
+
+def test_cache_once_builds_once_when_threads_miss_together():
+    built = []
+
+    @cache_once
+    def get_client(name):
+        time.sleep(0.05)  # Slow like importing and initializing an SDK
+        built.append(name)
+        return object()
+
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(get_client("model"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert built == ["model"]
+    assert len({id(client) for client in clients}) == 1
+    assert get_client("other") is not clients[0]
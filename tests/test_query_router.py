@@ -0,0 +1,56 @@
+# Questions and the answer the router gives locally, None means the question goes to the chat model
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_router import RecordIndex  # noqa: E402
+
+records = pd.DataFrame({
+    "video_title": ["video_1.mp4", "video_2.mp4", "video_3.mp4", "video_4.mp4"],
+    "created_time": ["2024-10-18 10:05:00", "2024-10-18 10:40:00", "2024-10-18 14:10:00", "2024-10-19 09:00:00"],
+    "analysis": [
+        "A person walks in from the left and stops at the shelf.",
+        "There is no people in the video.",
+        "A man is carrying a box toward the exit.",
+        "A woman takes a fire extinguisher from the wall near the cage.",
+    ],
+})
+
+questions = [
+    ("How many videos are there?", "4 of 4 videos in total."),
+    ("How many videos show people?", "3 of 4 videos with people."),
+    ("How many videos had no people?", "1 of 4 videos without people."),
+    ("How many videos without anyone?", "1 of 4 videos without people."),
+    ("How many videos with nobody?", "1 of 4 videos without people."),
+    ("How many videos where no one is carrying something?", "2 of 4 videos where nothing is taken or carried."),
+    ("How many videos are not suspicious?",
+     "3 of 4 videos without suspicious activity (cage or fire extinguisher)."),
+    ("How many videos mention a fire extinguisher?", "1 of 4 videos mentioning a fire extinguisher."),
+    ("How many videos were recorded between 10:00 and 11:00 on 2024-10-18?",
+     "2 of 4 videos recorded between 10:00 and 11:00 on 2024-10-18."),
+    ("Which videos mention the cage?", "1 video mentioning the cage:"),
+    ("List the videos where someone is carrying something",
+     "2 videos with people and where something is taken or carried:"),
+    # Words the router does not understand, or negations it cannot place
+    ("How many videos show a red car?", None),
+    ("How many videos show someone wearing a helmet?", None),
+    ("Which videos show someone near the window?", None),
+    ("How many videos didn't show anything?", None),
+    ("Is there any video where someone took something and no one noticed?", None),
+    ("Did anyone open the cage?", None),
+    ("What did the worker do with the package?", None),
+]
+
+
+@pytest.mark.parametrize("question, expected", questions)
+def test_answer(question, expected):
+    answer = RecordIndex(records).answer(question)
+    if expected is None:
+        assert answer is None
+    else:
+        assert answer is not None and answer.split("\n")[0] == expected
@@ -0,0 +1,102 @@
+# UploadQueue against the local storage backend: resume, retry with backoff and the spool cap
+
+import os
+import queue
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage_backend import LocalBucket  # noqa: E402
+from uploads import UploadQueue  # noqa: E402
+
+
+# Bucket whose first uploads fail, like GCS during a network outage
+class FlakyBucket(LocalBucket):
+    def __init__(self, root, failures):
+        super().__init__(root)
+        self.failures = failures
+        self.attempts = []
+
+    def blob(self, blob_name, chunk_size=None, generation=None):
+        self.attempts.append(time.time())
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("network is unreachable")
+        return super().blob(blob_name, chunk_size, generation)
+
+
+def make_file(directory, name, size=8):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as file:
+        file.write(b"x" * size)
+    return path
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def spool_dir(tmp_path):
+    return str(tmp_path / "spool")
+
+
+def test_pending_uploads_resume_after_a_restart(tmp_path, spool_dir):
+    bucket = LocalBucket(str(tmp_path / "bucket"))
+    # First run: journaled, then the process ends before any upload
+    producer = UploadQueue(bucket, spool_dir, workers=0)
+    producer.put(make_file(str(tmp_path), "a.mp4"), "f/video_a.mp4")
+    producer.put(make_file(str(tmp_path), "b.mp4"), "f/video_b.mp4")
+    assert producer.pending() == 2
+
+    restarted = UploadQueue(bucket, spool_dir, workers=2, poll_interval=0.01).start()
+    try:
+        wait_until(lambda: restarted.pending() == 0 and restarted.uploaded == 2)
+    finally:
+        restarted.stop()
+    assert sorted(blob.name for blob in bucket.list_blobs(prefix="f/")) == ["f/video_a.mp4", "f/video_b.mp4"]
+    assert restarted.spool_bytes() == 0
+
+
+def test_failed_uploads_are_retried_with_backoff(tmp_path, spool_dir):
+    bucket = FlakyBucket(str(tmp_path / "bucket"), failures=2)
+    upload_queue = UploadQueue(bucket, spool_dir, workers=1, poll_interval=0.01, backoff=0.1).start()
+    try:
+        upload_queue.put(make_file(str(tmp_path), "a.mp4"), "f/video_a.mp4")
+        wait_until(lambda: upload_queue.uploaded == 1)
+    finally:
+        upload_queue.stop()
+    assert upload_queue.retries == 2
+    assert bucket.get_blob("f/video_a.mp4") is not None
+    # Jittered exponential backoff: about 0.1 s, then about 0.2 s
+    gaps = [later - earlier for earlier, later in zip(bucket.attempts, bucket.attempts[1:])]
+    assert gaps[0] >= 0.05 and gaps[1] >= 0.1
+
+
+def test_put_blocks_while_the_spool_is_full(tmp_path, spool_dir):
+    bucket = LocalBucket(str(tmp_path / "bucket"))
+    producer = UploadQueue(bucket, spool_dir, workers=0, max_spool_bytes=10, poll_interval=0.01)
+    producer.put(make_file(str(tmp_path), "a.mp4"), "f/video_a.mp4")
+    with pytest.raises(queue.Full):
+        producer.put(make_file(str(tmp_path), "b.mp4"), "f/video_b.mp4", timeout=0.1)
+
+    blocked = threading.Thread(target=producer.put, args=(os.path.join(str(tmp_path), "b.mp4"), "f/video_b.mp4"))
+    blocked.start()
+    time.sleep(0.2)
+    assert blocked.is_alive()
+
+    # Once the first upload frees the spool, put() returns
+    uploader = UploadQueue(bucket, spool_dir, workers=1, poll_interval=0.01).start()
+    try:
+        blocked.join(5)
+        assert not blocked.is_alive()
+        wait_until(lambda: uploader.uploaded == 2)
+    finally:
+        uploader.stop()
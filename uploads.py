@@ -0,0 +1,196 @@
+# Uploads to the storage backend: resumable uploads with retries and a journaled
+# on-disk queue that survives network outages and restarts
+
+import json
+import os
+import queue
+import random
+import shutil
+import threading
+import time
+from datetime import datetime
+
+from metrics import get_metrics
+
+chunk_size = 8 * 1024 * 1024  # Resumable upload chunk size, must be a multiple of 256 KB
+
+
+# Function to upload a file as a resumable, chunked upload with the content type set at creation
+def upload_file(bucket, local_file, destination_blob_name, content_type, retries=5, backoff=1.0, max_backoff=60.0):
+    """Upload local_file and return the upload time, retrying with jittered exponential backoff."""
+    with get_metrics().call("storage", "upload") as call:
+        call.bytes = os.path.getsize(local_file)
+        for attempt in range(retries + 1):
+            try:
+                blob = bucket.blob(destination_blob_name, chunk_size=chunk_size)
+                blob.upload_from_filename(local_file, content_type=content_type)
+                return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            except Exception:
+                if attempt == retries:
+                    raise
+                call.retries += 1
+                time.sleep(min(max_backoff, backoff * 2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+# Durable upload queue backed by a spool directory
+class UploadQueue:
+    """Spool files to disk and upload them in the background.
+
+    Every job is a data file plus a small JSON journal entry in spool_dir. Jobs are only
+    removed after a successful upload, so pending uploads resume after a restart. Several
+    processes may put() into the same spool directory while one process runs the workers.
+    put() blocks while the spool is larger than max_spool_bytes.
+    """
+
+    def __init__(self, bucket, spool_dir, workers=2, max_spool_bytes=2 * 1024 ** 3, poll_interval=1.0,
+                 backoff=1.0, max_backoff=300.0):
+        self.bucket = bucket
+        self.spool_dir = spool_dir
+        self.workers = workers
+        self.max_spool_bytes = max_spool_bytes
+        self.poll_interval = poll_interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        os.makedirs(spool_dir, exist_ok=True)
+
+        # Finished uploads as {"blob_name", "upload_time"} for the caller to pick up
+        self.completed = queue.Queue()
+        self.uploaded = 0
+        self.retries = 0
+        self._claimed = set()
+        self._retry_at = {}
+        self._counter = 0
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"upload-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the workers, unfinished jobs stay in the spool for the next start."""
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def put(self, local_file, destination_blob_name, content_type="video/mp4", timeout=None):
+        """Move local_file into the spool and journal it, raises queue.Full on timeout."""
+        size = os.path.getsize(local_file)
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while self.spool_bytes() + size > self.max_spool_bytes and self.spool_bytes() > 0:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Full(f"Upload spool is over {self.max_spool_bytes} bytes")
+                self._condition.wait(self.poll_interval if remaining is None else min(remaining, self.poll_interval))
+
+            self._counter += 1
+            job_id = f"{time.time_ns()}-{os.getpid()}-{self._counter}"
+            data_file = job_id + os.path.splitext(local_file)[1]
+            try:
+                os.replace(local_file, os.path.join(self.spool_dir, data_file))
+            except OSError:
+                shutil.move(local_file, os.path.join(self.spool_dir, data_file))  # Spool is on another filesystem
+            self._write_journal(job_id, {
+                "blob_name": destination_blob_name,
+                "content_type": content_type,
+                "data_file": data_file,
+                "attempts": 0,
+                "queued_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            })
+            self._condition.notify()
+        return job_id
+
+    def pending(self):
+        return sum(1 for name in os.listdir(self.spool_dir) if name.endswith(".json"))
+
+    def spool_bytes(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.spool_dir) if entry.is_file())
+
+    def stats(self):
+        return {
+            "pending": self.pending(),
+            "spool_bytes": self.spool_bytes(),
+            "uploaded": self.uploaded,
+            "retries": self.retries,
+        }
+
+    def drain_completed(self):
+        finished = []
+        while True:
+            try:
+                finished.append(self.completed.get_nowait())
+            except queue.Empty:
+                return finished
+
+    def _journal_path(self, job_id):
+        return os.path.join(self.spool_dir, job_id + ".json")
+
+    def _write_journal(self, job_id, job):
+        temp_path = self._journal_path(job_id) + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(job, file)
+        os.replace(temp_path, self._journal_path(job_id))  # Atomic, a crash never leaves half a journal
+
+    # Oldest job that is not being uploaded and not waiting for its retry time
+    def _claim(self):
+        with self._condition:
+            now = time.time()
+            for name in sorted(os.listdir(self.spool_dir)):
+                job_id = name[:-len(".json")]
+                if not name.endswith(".json") or job_id in self._claimed or self._retry_at.get(job_id, 0) > now:
+                    continue
+                self._claimed.add(job_id)
+                return job_id
+        return None
+
+    def _work(self):
+        while not self._stop_event.is_set():
+            job_id = self._claim()
+            if job_id is None:
+                with self._condition:
+                    self._condition.wait(self.poll_interval)
+                continue
+            try:
+                self._upload(job_id)
+            finally:
+                with self._condition:
+                    self._claimed.discard(job_id)
+                    self._condition.notify_all()
+
+    def _upload(self, job_id):
+        try:
+            with open(self._journal_path(job_id), encoding="utf-8") as file:
+                job = json.load(file)
+        except (OSError, ValueError):
+            return  # Removed by another worker in the meantime
+        data_path = os.path.join(self.spool_dir, job["data_file"])
+        if not os.path.exists(data_path):
+            os.unlink(self._journal_path(job_id))  # Nothing left to upload
+            return
+
+        try:
+            upload_time = upload_file(self.bucket, data_path, job["blob_name"], job["content_type"], retries=0)
+        except Exception as e:
+            # Keep the job and try again later, the segment is never dropped
+            job["attempts"] += 1
+            job["last_error"] = str(e)
+            self._write_journal(job_id, job)
+            delay = min(self.max_backoff, self.backoff * 2 ** (job["attempts"] - 1))
+            with self._condition:
+                self.retries += 1
+                self._retry_at[job_id] = time.time() + delay * random.uniform(0.5, 1.5)
+            return
+
+        os.unlink(data_path)
+        os.unlink(self._journal_path(job_id))
+        with self._condition:
+            self._retry_at.pop(job_id, None)
+            self.uploaded += 1
+        self.completed.put({"blob_name": job["blob_name"], "upload_time": upload_time})
@@ -0,0 +1,81 @@
+# Size-capped local cache of downloaded videos, validated by the GCS generation and
+# evicted least recently used first
+
+import functools
+import hashlib
+import os
+import threading
+
+from metrics import get_metrics
+from storage_backend import LocalBlob
+
+
+class VideoCache:
+    """Directory of downloaded blobs named by blob name hash and generation.
+
+    A new generation of a blob is a new file, so overwritten videos are never served stale.
+    Reading a cached file refreshes its modification time, eviction removes the oldest files
+    until the cache is below max_bytes again.
+    """
+
+    def __init__(self, directory, max_bytes=2 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _name_prefix(self, blob_name):
+        return hashlib.sha1(blob_name.encode("utf-8")).hexdigest()[:16]
+
+    def path_for(self, blob):
+        extension = os.path.splitext(blob.name)[1]
+        return os.path.join(self.directory, f"{self._name_prefix(blob.name)}_{blob.generation}{extension}")
+
+    def get(self, blob):
+        """Local path of the blob's current generation, downloaded if it is not cached."""
+        if isinstance(blob, LocalBlob):
+            return blob.path  # Already a local file
+        path = self.path_for(blob)
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path)
+                self.hits += 1
+                return path
+            self.misses += 1
+
+        temp_path = f"{path}.{threading.get_ident()}.part"
+        with get_metrics().call("storage", "download") as call:
+            blob.download_to_filename(temp_path)
+            call.bytes = os.path.getsize(temp_path)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            # Older generations of the same blob are never needed again
+            prefix = self._name_prefix(blob.name) + "_"
+            for name in os.listdir(self.directory):
+                if name.startswith(prefix) and os.path.join(self.directory, name) != path and not name.endswith(".part"):
+                    os.unlink(os.path.join(self.directory, name))
+            self._evict(keep=path)
+        return path
+
+    def _evict(self, keep):
+        entries = [entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.endswith(".part")]
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            if total <= self.max_bytes:
+                break
+            if entry.path == keep:
+                continue
+            total -= entry.stat().st_size
+            os.unlink(entry.path)
+
+    def size(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+
+# Function to get the process wide cache of a directory
+@functools.lru_cache(maxsize=None)
+def get_video_cache(directory, max_bytes=2 * 1024 ** 3):
+    return VideoCache(directory, max_bytes)
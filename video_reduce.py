@@ -0,0 +1,96 @@
+# Reduced proxies of recorded videos for analysis: lower frame rate, lower resolution
+# and long static spans cut out, with a map back to the original timestamps
+
+import bisect
+import re
+
+import cv2
+
+from recorder import H264SegmentWriter, MotionDetector
+
+
+# Function to write a reduced proxy of input_path to output_path
+def reduce_video(input_path, output_path, target_fps=1.0, max_width=640, motion_threshold=0.005,
+                 max_idle_seconds=2.0):
+    """Return {"time_map", "original_seconds", "proxy_seconds", "frames_kept"}.
+
+    Frames are sampled at target_fps and downscaled to max_width. Once the picture has been
+    static for max_idle_seconds, further static frames are dropped until motion resumes.
+    time_map is a list of (proxy_seconds, original_seconds) pairs, one per kept frame.
+    """
+    cap = cv2.VideoCapture(input_path)
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    detector = MotionDetector(threshold=motion_threshold)
+    step = 1.0 / target_fps
+
+    writer = None
+    time_map = []
+    next_sample = 0.0
+    idle_since = None
+    frame_index = 0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp = frame_index / source_fps
+            frame_index += 1
+            if timestamp + 1e-6 < next_sample:
+                continue
+            while next_sample <= timestamp + 1e-6:
+                next_sample += step
+
+            # libx264 with yuv420p needs even dimensions, also for frames that are not downscaled
+            height, width = frame.shape[:2]
+            new_width = min(width, max_width) // 2 * 2
+            new_height = height * new_width // width // 2 * 2
+            if (new_width, new_height) != (width, height):
+                frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
+
+            # Keep the first seconds of every static span so the scene is still visible
+            if detector.is_motion(detector.score(frame)):
+                idle_since = None
+            elif idle_since is None:
+                idle_since = timestamp
+            elif timestamp - idle_since >= max_idle_seconds:
+                continue
+
+            if writer is None:
+                writer = H264SegmentWriter(output_path, target_fps, (frame.shape[1], frame.shape[0]))
+            writer.write(frame)
+            time_map.append((round(len(time_map) * step, 3), round(timestamp, 3)))
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        raise ValueError(f"No frames could be read from {input_path}")
+    return {
+        "time_map": time_map,
+        "original_seconds": frame_index / source_fps,
+        "proxy_seconds": len(time_map) * step,
+        "frames_kept": len(time_map),
+    }
+
+
+def proxy_to_original(time_map, proxy_seconds):
+    """Original timestamp of a moment in the proxy."""
+    proxy_times = [proxy for proxy, _ in time_map]
+    index = max(0, bisect.bisect_right(proxy_times, proxy_seconds) - 1)
+    proxy, original = time_map[index]
+    return original + (proxy_seconds - proxy)
+
+
+# Function to rewrite mm:ss timestamps the model reported for the proxy into original times
+def remap_timestamps(text, time_map):
+    proxy_duration = time_map[-1][0] if time_map else 0.0
+
+    def replace(match):
+        seconds = int(match.group(1)) * 60 + int(match.group(2))
+        if seconds > proxy_duration + 1:
+            return match.group(0)  # Not a proxy timestamp
+        original = int(round(proxy_to_original(time_map, seconds)))
+        return f"{original // 60:02d}:{original % 60:02d}"
+
+    return re.sub(r"\b(\d{1,2}):([0-5]\d)\b", replace, text)